@@ -4,7 +4,9 @@ import asyncio
 import inspect
 
 from tg_bot import TelegramBot
-from parse import ArbitoidAPI
+from resolver import CoinResolver
+from async_parse import AsyncCoinGeckoAPI, AsyncArbitoidAPI
+from transport import AsyncHTTPTransport
 
 
 async def main() -> None:
@@ -20,9 +22,19 @@ async def main() -> None:
         logger.addHandler(file_handler)
 
         cfg = json.load(open('cfg.json', 'r'))
-        arbitoid = ArbitoidAPI(cfg['FastAPI']['params'], logger)
-
-        aio_bot = TelegramBot(cfg['telegram']['bot']['api_token'], arbitoid, logger)
+        AsyncCoinGeckoAPI.set_transport(AsyncHTTPTransport(
+            cfg['parse']['transport']['pool_size'], cfg['parse']['transport']['timeout'],
+            cfg['parse']['transport']['concurrency'], logger
+        ))
+        arbitoid = AsyncArbitoidAPI(cfg['FastAPI']['params'], logger)
+
+        resolver = CoinResolver(
+            arbitoid, cfg['telegram']['resolver']['refresh'], cfg['telegram']['resolver']['suggestions'], logger
+        )
+
+        aio_bot = TelegramBot(
+            cfg['telegram']['bot']['api_token'], arbitoid, logger, resolver, cfg['telegram']['deadline']['pairs']
+        )
         await aio_bot.dp.skip_updates()
 
         tasks = [
@@ -36,14 +48,17 @@ async def main() -> None:
         logging.error(f"{func_name}/{error.__class__}||{error.args[0]}")
         quit()
 
+    finally:
+        await AsyncCoinGeckoAPI.close()
+
 
-async def update_req(arbitoid: ArbitoidAPI, interval: int = 60, logger=None):
+async def update_req(arbitoid: AsyncArbitoidAPI, interval: int = 60, logger=None):
     func_name = inspect.currentframe().f_code.co_name
 
     try:
         while 1:
             await asyncio.sleep(interval)
-            arbitoid.reset_req()
+            await arbitoid.reset_req()
 
     except Exception as error:
         logger.error(f"{func_name}/{error.__class__}||{error.args[0]}") if logger else 0
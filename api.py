@@ -1,9 +1,15 @@
 import json
+import time
 import logging
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Query
 
 from parse import CoinGeckoAPI
+from cache import TTLCache
+from scheduler import RateScheduler
+from sqlite_cache import SQLiteCache
+from negative import NegativeCache
+from transport import HTTPTransport, DeadlineExceeded
 from database.dbapi import DatabaseConnector
 
 cfg = json.load(open('cfg.json', 'r'))
@@ -18,16 +24,62 @@ logger.addHandler(file_handler)
 
 
 app = FastAPI()
+CoinGeckoAPI.set_transport(HTTPTransport(
+    cfg['parse']['transport']['pool_size'], cfg['parse']['transport']['timeout'],
+    cfg['parse']['transport']['http2'], logger
+))
 db_con = DatabaseConnector(cfg['database']['params'], logger)
+scheduler = RateScheduler(
+    cfg['parse']['rate_limit']['rpm'], cfg['parse']['rate_limit']['burst'],
+    cfg['parse']['rate_limit']['max_backoff'], cfg['parse']['rate_limit']['retries'], logger
+)
+store = SQLiteCache(
+    cfg['CoinGecko']['store']['path'], cfg['CoinGecko']['store']['ttl'], cfg['CoinGecko']['store']['size_mb'],
+    cfg['CoinGecko']['store']['timeout'], cfg['CoinGecko']['store']['touch'], logger
+) if cfg['CoinGecko']['store']['enabled'] else None
 gecko_api = CoinGeckoAPI(
     cfg['CoinGecko']['link'], cfg['CoinGecko']['network_fees'], cfg['CoinGecko']['market_fees'],
-    cfg['parse']['headers'], {"https": f"http://{cfg['parse']['proxy']['proxy2']}"}, logger
+    cfg['parse']['headers'], {"https": f"http://{cfg['parse']['proxy']['proxy2']}"}, logger,
+    TTLCache(cfg['CoinGecko']['cache']['ttl'], cfg['CoinGecko']['cache']['size'], logger),
+    scheduler.bucket({"https": f"http://{cfg['parse']['proxy']['proxy2']}"}), store,
+    NegativeCache(
+        cfg['CoinGecko']['negative']['ttl'], cfg['CoinGecko']['negative']['size'], store,
+        cfg['CoinGecko']['negative']['recheck'], logger
+    ) if cfg['CoinGecko']['negative']['enabled'] else None
 )
 
 
+# last answer of every coin, what a request that runs out of budget gets back (with its age in seconds)
+last_pairs = TTLCache(cfg['FastAPI']['deadline']['stale'], cfg['FastAPI']['deadline']['size'], logger)
+
+
 @app.get("/arbitoid/gecko_pairs/{coin}")
-def gecko_pairs(coin: str) -> dict:
-    response = gecko_api.gecko_pairs(coin)
+def gecko_pairs(coin: str, budget: float = Query(None, gt=0)) -> dict:
+    # the caller's budget, capped, becomes the deadline of the CoinGecko fetch
+    budget = min(budget or cfg['FastAPI']['deadline']['max_budget'], cfg['FastAPI']['deadline']['max_budget'])
+
+    try:
+        response = gecko_api.gecko_pairs(coin, time.monotonic() + budget)
+
+        # [] is also what a failed fetch gives, only an actual case is worth serving stale
+        last_pairs.set(coin, (time.monotonic(), response)) if response else 0
+
+        return {'Response': response}
+
+    except DeadlineExceeded:
+        logger.warning(f"gecko_pairs/{coin}/{budget}")
+
+        stamp, response = last_pairs.get(coin, (None, None))
+
+        if stamp is None:
+            return {'Response': [], 'Timeout': budget}
+
+        return {'Response': response, 'Stale': round(time.monotonic() - stamp)}
+
+
+@app.get("/arbitoid/gecko_coins")
+def gecko_coins() -> dict:
+    response = gecko_api.gecko_coins()
     return {'Response': response}
 
 
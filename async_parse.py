@@ -0,0 +1,354 @@
+import json
+import asyncio
+import inspect
+from random import choice
+
+from parse import CoinGeckoAPI, ArbitoidAPI
+from decode import decode_coin, dump_coin, load_coin
+from negative import CoinNotFound, UNKNOWN_ID
+from prefilter import prune_market
+from scheduler import TokenBucket
+from transport import AsyncHTTPTransport, AsyncResponse, ASYNC_TRANSPORT_ERRORS
+
+
+class AsyncCoinGeckoAPI(CoinGeckoAPI):
+    # Same surface as CoinGeckoAPI, but every network call is a coroutine on one shared aiohttp pool
+
+    transport = AsyncHTTPTransport()
+
+    @classmethod
+    def set_transport(cls, transport: AsyncHTTPTransport) -> None:
+        cls.transport = transport
+
+    @classmethod
+    async def close(cls) -> None:
+        await cls.transport.close()
+
+    @classmethod
+    async def get_response(cls, link: str, req_type: str = "GET", data: dict = None,
+                           headers: dict = None, proxy: dict = None,
+                           timeout: float or tuple = None, limiter: TokenBucket = None) -> AsyncResponse or int:
+
+        if proxy is None:
+            proxy = {}
+
+        if headers is None:
+            headers = {}
+
+        if data is None:
+            data = {}
+
+        try:
+            req_type = req_type.upper() if req_type.upper() in ("POST", "PUT") else "GET"
+
+            # without a limiter (calls to our own FastAPI) the loop runs exactly once
+            for attempt in range(limiter.retries + 1 if limiter else 1):
+                if limiter:
+                    await asyncio.sleep(limiter.reserve())
+
+                request = await cls.transport.request(
+                    req_type, link, params=data if req_type != "GET" else None,
+                    headers={'user-agent': choice(headers['user_agents'])} if headers else {}, proxy=proxy,
+                    timeout=timeout
+                )
+
+                if not limiter or not limiter.feedback(request.status_code, request.headers.get('Retry-After')):
+                    break
+
+            if request.status_code == 404:
+                raise CoinNotFound(link)
+
+            if request.status_code != 200:
+                return -1
+
+            return request
+
+        except ASYNC_TRANSPORT_ERRORS as error:
+            return -1
+
+    '''
+    ----------------------------------------------
+                    Client logic
+    ----------------------------------------------
+    '''
+
+    async def load_coin_stats(self, coin: str) -> dict:
+        loop = asyncio.get_running_loop()
+
+        # SQLite may wait on another process' write, that wait happens off the event loop
+        stored = await loop.run_in_executor(None, self.store.get, f"coin:{coin}") if self.store else None
+
+        if stored is not None:
+            return load_coin(stored)
+
+        link_to_parse = self.get_coin_link(coin)
+        response = await self.get_response(
+            link=link_to_parse, headers=self.headers, proxy=self.proxy, limiter=self.limiter
+        )
+
+        # only the fields the arbitrage logic reads are kept, that is also what the caches hold
+        coin_stats = decode_coin(response.content)
+        await loop.run_in_executor(None, self.store.set, f"coin:{coin}", dump_coin(coin_stats)) if self.store else 0
+
+        return coin_stats
+
+    async def coin_stats(self, coin: str) -> dict:
+        return await self.cache.aget_or_load(coin, lambda: self.load_coin_stats(coin))
+
+    async def get_network(self, coin: str or dict = None) -> tuple:
+        func_name = inspect.currentframe().f_code.co_name
+
+        try:
+
+            if type(coin) == str:
+                coin = await self.coin_stats(coin)
+
+            return self.select_network(list(coin['platforms'].keys()))
+
+        except Exception as error:
+            self.logger.error(f"{func_name}/{error.__class__}||{error.args[0]}") if self.logger else 0
+            return ()
+
+        finally:
+            self.logger.info(f"{func_name}/{coin}") if self.logger else 0
+
+    async def global_volume(self, coin: str or dict = None) -> float:
+        func_name = inspect.currentframe().f_code.co_name
+
+        try:
+
+            if type(coin) == str:
+                coin = await self.coin_stats(coin)
+
+            return coin['market_data']['total_volume']['usd']
+
+        except Exception as error:
+            self.logger.error(f"{func_name}/{error.__class__}||{error.args[0]}") if self.logger else 0
+            return -1
+
+        finally:
+            self.logger.info(f"{func_name}/{coin}") if self.logger else 0
+
+    async def usable_tickers(self, coin: str) -> tuple:
+        if self.negative and await self.negative.aget(coin):
+            return ()
+
+        try:
+            coin_stats = await self.coin_stats(coin)
+
+        except CoinNotFound:
+            await self.negative.aset(coin, UNKNOWN_ID) if self.negative else 0
+            return ()
+
+        r2_parse, networks = self.market_tickers(coin_stats)
+
+        if len(r2_parse) > 2:
+            return r2_parse, networks
+
+        await self.negative.aset(coin, self.miss_reason(coin_stats, r2_parse)) if self.negative else 0
+        return ()
+
+    async def gecko_pairs(self, coin: str) -> list:
+        func_name = inspect.currentframe().f_code.co_name
+
+        try:
+            usable = await self.usable_tickers(coin)
+            cases = self.arbitrage_cases(*usable) if usable else []
+
+            return cases[0] if cases else []
+
+        except Exception as error:
+            self.logger.error(f"{func_name}/{error.__class__}||{error.args[0]}") if self.logger else 0
+            return []
+
+        finally:
+            self.logger.info(f"{func_name}/{coin}") if self.logger else 0
+
+    async def gecko_tickers(self, coin: str) -> list:
+        func_name = inspect.currentframe().f_code.co_name
+
+        try:
+            usable = await self.usable_tickers(coin)
+            return [usable] if usable else []
+
+        except Exception as error:
+            self.logger.error(f"{func_name}/{error.__class__}||{error.args[0]}") if self.logger else 0
+            return []
+
+        finally:
+            self.logger.info(f"{func_name}/{coin}") if self.logger else 0
+
+    '''
+    ----------------------------------------------
+                    Parser logic
+    ----------------------------------------------
+    '''
+
+    async def input_loc(self, array: list, page: int, per_page: int = 100, markets: list = None) -> None:
+        func_name = inspect.currentframe().f_code.co_name
+
+        try:
+            link_to_parse = self.markets_link(page, per_page)
+            response = await self.get_response(
+                link=link_to_parse, headers=self.headers, proxy=self.proxy, limiter=self.limiter
+            )
+
+            loc = json.loads(response.content)
+
+            for coin in loc:
+                array.append(coin["id"])
+
+            # the bulk row already tells a lot about the coin (volume, 24h range), kept for the prefilter
+            markets.extend(map(prune_market, loc)) if markets is not None else 0
+
+        except Exception as error:
+            self.logger.error(f"{func_name}/{error.__class__}||{error.args[0]}") if self.logger else 0
+
+        finally:
+            self.logger.info(f"{func_name}/{array}/{page}") if self.logger else 0
+
+    async def gecko_loc(self, pages: int = 2, per_page: int = 100) -> list:
+        func_name = inspect.currentframe().f_code.co_name
+
+        try:
+            # every page is fetched at once and merged back in market cap order
+            r2_pages = [[] for _ in range(pages)]
+            await asyncio.gather(*[
+                self.input_loc(r2_pages[page - 1], page, per_page) for page in range(1, pages + 1)
+            ])
+
+            return [coin for r2_page in r2_pages for coin in r2_page]
+
+        except Exception as error:
+            self.logger.error(f"{func_name}/{error.__class__}||{error.args[0]}") if self.logger else 0
+
+        finally:
+            self.logger.info(f"{func_name}/{pages}") if self.logger else 0
+
+    async def load_coins(self, pages: int = 2) -> dict:
+        response = await self.get_response(
+            link="https://api.coingecko.com/api/v3/coins/list", headers=self.headers, proxy=self.proxy,
+            limiter=self.limiter
+        )
+
+        coins = [[coin['id'], coin['symbol'], coin['name']] for coin in json.loads(response.content)]
+        return {'coins': coins, 'ranked': await self.gecko_loc(pages, 250) or []}
+
+    async def gecko_coins(self, ttl: float = 3600) -> dict:
+        func_name = inspect.currentframe().f_code.co_name
+
+        try:
+            coins = self.cache.get('coins:list')
+
+            if coins is None:
+                coins = await self.load_coins()
+                self.cache.set('coins:list', coins, ttl) if coins['coins'] else 0
+
+            return coins
+
+        except Exception as error:
+            self.logger.error(f"{func_name}/{error.__class__}||{error.args[0]}") if self.logger else 0
+            return {}
+
+        finally:
+            self.logger.info(f"{func_name}") if self.logger else 0
+
+
+class AsyncArbitoidAPI(ArbitoidAPI):
+    # Non-blocking twin of ArbitoidAPI for the aiogram bot, calculations (profit_between_markets...) are inherited
+
+    async def api_response(self, func_name: str, route: str, req_type: str = "GET", data: dict = None,
+                           log: str = '', timeout: float = None) -> dict:
+
+        try:
+            link_to_parse = f"{self.api_link}/{route}"
+            response = await AsyncCoinGeckoAPI.get_response(
+                link_to_parse, req_type=req_type, data=data, timeout=timeout
+            )
+
+            json_response = json.loads(response.content)
+
+            return json_response
+
+        except Exception as error:
+            self.logger.error(f"{func_name}/{error.__class__}||{error.args[0]}") if self.logger else 0
+            return {}
+
+        finally:
+            self.logger.info(f"{func_name}{log}") if self.logger else 0
+
+    '''
+    ----------------------------------------------
+                   Client logic
+    ----------------------------------------------
+    '''
+
+    async def gecko_pairs(self, coin: str, budget: float = None) -> dict:
+        return await self.api_response(
+            "gecko_pairs", f"arbitoid/gecko_pairs/{coin}" + (f"?budget={budget}" if budget else ""),
+            timeout=budget + 1 if budget else None
+        )
+
+    async def gecko_coins(self) -> dict:
+        return await self.api_response("gecko_coins", "arbitoid/gecko_coins")
+
+    '''
+    ----------------------------------------------
+                   Database logic
+    ----------------------------------------------
+    '''
+
+    # properties hand back a coroutine, so call sites stay `await self.arbitoid.get_admins`
+
+    @property
+    def get_stats(self):
+        return self.api_response("get_stats", "user/get_stats")
+
+    @property
+    def get_ready_users(self):
+        return self.api_response("get_ready_users", "user/get_ready_users")
+
+    @property
+    def get_admins(self):
+        return self.api_response("get_admins", "user/get_admins")
+
+    async def get_user(self, tg_id: int) -> dict:
+        return await self.api_response("get_user", f"user/get_user/{tg_id}", log=f"/{tg_id}")
+
+    async def check_sub(self, tg_id: int) -> dict:
+        return await self.api_response("check_sub", f"user/check_sub/{tg_id}", log=f"/{tg_id}")
+
+    async def resize_percent(self, tg_id: int, percent: float) -> dict:
+        return await self.api_response(
+            "resize_percent", "user/resize_percent", "PUT", {"tg_id": tg_id, "percent": percent},
+            log=f"/{tg_id}/{percent}"
+        )
+
+    async def add_req(self, tg_id: int) -> dict:
+        return await self.api_response("add_req", "user/add_req", "PUT", {"tg_id": tg_id}, log=f"/{tg_id}")
+
+    async def remove_req(self, tg_id: int) -> dict:
+        return await self.api_response("remove_req", "user/remove_req", "POST", {"tg_id": tg_id}, log=f"/{tg_id}")
+
+    async def reset_req(self) -> dict:
+        return await self.api_response("reset_req", "user/reset_req", "POST")
+
+    async def add_sub(self, tg_id: int, np: int) -> dict:
+        return await self.api_response(
+            "add_sub", "user/add_sub", "POST", {"tg_id": tg_id, "np": np}, log=f"/{tg_id}/{np}"
+        )
+
+    async def add_admin(self, tg_id: int, np: int) -> dict:
+        return await self.api_response(
+            "add_admin", "user/add_admin", "POST", {"tg_id": tg_id, "np": np}, log=f"/{tg_id}/{np}"
+        )
+
+    async def input_user(self, tg_id: int, username: str = None) -> dict:
+        return await self.api_response(
+            "input_user", "user/input_user", "POST", {"tg_id": tg_id, "username": username}, log=f"/{tg_id}"
+        )
+
+    async def switch_status(self, tg_id: int) -> dict:
+        return await self.api_response(
+            "switch_status", "user/switch_status", "POST", {"tg_id": tg_id}, log=f"/{tg_id}"
+        )
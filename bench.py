@@ -0,0 +1,47 @@
+import sys
+import time
+import random
+
+import numpy as np
+
+from parse import ArbitoidAPI
+
+
+def bench_profit(routes: int = 10000, seed: int = 0) -> dict:
+    # scalar profit_between_markets in a loop vs one profit_between_markets_batch call on the same random routes
+    rnd = random.Random(seed)
+
+    buy_prices = [rnd.uniform(0.5, 1.5) for _ in range(routes)]
+    sell_prices = [price * rnd.uniform(0.9, 1.2) for price in buy_prices]
+    buy_fees = [rnd.choice([0.05, 0.1, 0.2, 0.26, 0.4, 1.49]) for _ in range(routes)]
+    sell_fees = [rnd.choice([0.05, 0.1, 0.2, 0.26, 0.4, 1.49]) for _ in range(routes)]
+    networks = [rnd.choice([[0, 0], [0.001, 0.001], [0.1, 0.5], [0.269, 0.573]]) for _ in range(routes)]
+
+    start = time.perf_counter()
+    scalar = [
+        ArbitoidAPI.profit_between_markets(
+            'buy', buy_prices[i], 'sell', sell_prices[i], networks[i], {'buy': buy_fees[i], 'sell': sell_fees[i]}
+        )
+        for i in range(routes)
+    ]
+    scalar_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = ArbitoidAPI.profit_between_markets_batch(
+        buy_prices, sell_prices, buy_fees, sell_fees,
+        [min(network) for network in networks], [max(network) for network in networks]
+    )
+    batch_time = time.perf_counter() - start
+
+    return {
+        'routes': routes,
+        'scalar_s': round(scalar_time, 4),
+        'batch_s': round(batch_time, 4),
+        'speedup': round(scalar_time / batch_time, 1),
+        'mismatches': int(np.count_nonzero(np.any(np.array(scalar) != batch, axis=1)))
+    }
+
+
+if __name__ == '__main__':
+    for size in map(int, sys.argv[1:] or [1000, 10000, 100000]):
+        print(bench_profit(size))
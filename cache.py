@@ -0,0 +1,120 @@
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class TTLCache:
+
+    def __init__(self, ttl: float = 30, size: int = 512, logger=None):
+        # seconds a coin document stays fresh and max number of documents held (least recently used go first)
+        self.ttl = ttl
+        self.size = size
+
+        self.logger = logger
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        # single-flight: callers asking for a key that is already being loaded wait for that load instead
+        self._inflight = {}
+        self._ainflight = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                return default
+
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return default
+
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl: float = None) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            return default if entry is None else entry[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_or_load(self, key, loader, timeout: float = None):
+        value = self.get(key)
+
+        if value is not None:
+            return value
+
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+
+            if leader:
+                future = self._inflight[key] = Future()
+
+        if not leader:
+            # a follower with its own deadline stops waiting for the leader's load when that deadline comes
+            return future.result(timeout)
+
+        try:
+            value = loader()
+            self.set(key, value)
+            future.set_result(value)
+            return value
+
+        except BaseException as error:
+            # failures aren't cached, but everyone who waited on this load gets the same error
+            future.set_exception(error)
+            raise
+
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    async def aget_or_load(self, key, loader):
+        value = self.get(key)
+
+        if value is not None:
+            return value
+
+        future = self._ainflight.get(key)
+
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = self._ainflight[key] = asyncio.get_running_loop().create_future()
+
+        try:
+            value = await loader()
+            self.set(key, value)
+            future.set_result(value)
+            return value
+
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+
+        except Exception as error:
+            future.set_exception(error)
+            # nobody may be waiting, don't let asyncio complain about a never retrieved exception
+            future.exception()
+            raise
+
+        finally:
+            del self._ainflight[key]
@@ -1,7 +1,7 @@
 import inspect
 from datetime import datetime, date, timedelta
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 
 from database.models import User
@@ -15,6 +15,10 @@ class DatabaseConnector:
         self.engine = create_engine(connection_string)
         self.Session = sessionmaker(self.engine)
         self.logger = logger
+
+        # advisory locks live as long as the session that took them, so every held lock keeps its own connection
+        self.locks = {}
+
         self.create_tables()
 
     def create_tables(self) -> int:
@@ -337,3 +341,80 @@ class DatabaseConnector:
             self.logger.info(f"{func_name}/{tg_id}/{np}") if self.logger else 0
 
         return 0
+
+    '''             
+   ----------------------------------------------
+                   Coordination logic             
+   ----------------------------------------------
+    '''
+
+    def try_lock(self, key: int, keepalive: int = 5) -> bool:
+        func_name = inspect.currentframe().f_code.co_name
+        connection = None
+
+        try:
+            if key in self.locks:
+                return self.check_lock(key)
+
+            # autocommit, an idle transaction could be killed by idle_in_transaction_session_timeout with the lock
+            connection = self.engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+
+            # the server notices a dead holder in about keepalive * 2 seconds and frees the lock for a standby
+            connection.execute(text(f"SET tcp_keepalives_idle = {int(keepalive)}"))
+            connection.execute(text(f"SET tcp_keepalives_interval = {max(1, int(keepalive) // 2)}"))
+            connection.execute(text("SET tcp_keepalives_count = 2"))
+
+            if connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": key}).scalar():
+                self.locks[key], connection = connection, None
+                return True
+
+            return False
+
+        except Exception as error:
+            self.logger.error(f"{func_name}/{error.__class__}||{error.args[0]}") if self.logger else 0
+            return False
+
+        finally:
+            connection.close() if connection is not None else 0
+            self.logger.info(f"{func_name}/{key}") if self.logger else 0
+
+    def check_lock(self, key: int) -> bool:
+        func_name = inspect.currentframe().f_code.co_name
+        held = False
+
+        try:
+            held = bool(self.locks[key].execute(
+                text("SELECT count(*) FROM pg_locks WHERE locktype = 'advisory' AND pid = pg_backend_pid() "
+                     "AND granted AND objsubid = 1 AND ((classid::bigint << 32) | objid::bigint) = :key"),
+                {"key": key}
+            ).scalar())
+
+        except Exception as error:
+            # a broken connection means the server has already released the lock
+            self.logger.error(f"{func_name}/{error.__class__}||{error.args[0]}") if self.logger else 0
+
+        finally:
+            if not held and key in self.locks:
+                self.release_lock(key)
+
+            self.logger.info(f"{func_name}/{key}") if self.logger else 0
+
+        return held
+
+    def release_lock(self, key: int) -> int:
+        func_name = inspect.currentframe().f_code.co_name
+        connection = self.locks.pop(key, None)
+
+        try:
+            if connection is not None:
+                connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+
+        except Exception as error:
+            self.logger.error(f"{func_name}/{error.__class__}||{error.args[0]}") if self.logger else 0
+            return -1
+
+        finally:
+            connection.close() if connection is not None else 0
+            self.logger.info(f"{func_name}/{key}") if self.logger else 0
+
+        return 0
@@ -0,0 +1,65 @@
+import math
+import inspect
+
+from cache import TTLCache
+
+
+class AlertDedup:
+    # Remembers which user got which opportunity, so a spread that survives several sweeps is announced once.
+    # An opportunity is (coin, buy market, sell market, profit bucket): a move into another bucket is a new alert
+
+    def __init__(self, cooldown: float = 900, bucket: float = 1.0, size: int = 50000, logger=None):
+        # seconds a user isn't sent the same opportunity again, width of a profit bucket in %, max (user, case) pairs
+        self.cooldown = cooldown
+        self.bucket = bucket
+
+        self.logger = logger
+
+        # bounded LRU with per-entry expiry, the oldest pairs go first when the store is full
+        self.sent = TTLCache(cooldown, size, logger)
+
+        self.stats = {'sent': 0, 'suppressed': 0}
+
+    def __len__(self) -> int:
+        return len(self.sent)
+
+    def case_key(self, coin: str, arb_case: list, total_profit: list) -> tuple:
+        return (
+            coin.lower(), arb_case[0]['market']['name'], arb_case[1]['market']['name'],
+            math.floor(total_profit[0] / self.bucket)
+        )
+
+    def pending(self, coin: str, arb_case: list, total_profit: list, users: list) -> list:
+        # users that haven't been sent this opportunity within the cooldown, claimed until record() settles them
+        func_name = inspect.currentframe().f_code.co_name
+        key = self.case_key(coin, arb_case, total_profit)
+
+        pending = [user for user in users if self.sent.get((user['id'], key)) is None]
+
+        # a claim doesn't expire: a fan-out to thousands of chats outlasts any fixed hold, so a concurrent announce
+        # of the same case would send it twice. record() settles every claim, even when the fan-out failed
+        for user in pending:
+            self.sent.set((user['id'], key), False, math.inf)
+
+        self.stats['suppressed'] += len(users) - len(pending)
+
+        self.logger.info(f"{func_name}/{key}/{len(pending)}/{len(users)}") if self.logger else 0
+        return pending
+
+    def record(self, coin: str, arb_case: list, total_profit: list, delivered: dict) -> None:
+        # {user id: delivered?} from AlertSender.fan_out: delivered pairs go quiet for the cooldown,
+        # the others are released so the next sweep that still sees the opportunity tries again
+        key = self.case_key(coin, arb_case, total_profit)
+
+        for user_id, ok in delivered.items():
+            if ok:
+                self.sent.set((user_id, key), True, self.cooldown)
+
+            else:
+                self.sent.pop((user_id, key))
+
+        self.stats['sent'] += sum(delivered.values())
+
+    def reset(self) -> None:
+        self.sent.clear()
+        self.stats = {'sent': 0, 'suppressed': 0}
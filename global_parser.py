@@ -1,123 +1,435 @@
-import time
 import json
+import time
+import queue
+import signal
+import asyncio
 import inspect
 import logging
-from concurrent.futures.thread import ThreadPoolExecutor
+import multiprocessing
+from functools import partial
 
-from telebot import TeleBot
-import aiogram.utils.markdown as md
+from aiogram import Bot
 
-from parse import CoinGeckoAPI, ArbitoidAPI
+from async_parse import AsyncCoinGeckoAPI, AsyncArbitoidAPI
+from cache import TTLCache
+from database.dbapi import DatabaseConnector
+from dedup import AlertDedup
+from leader import LeaderLease
+from negative import NegativeCache
+from pipeline import ScanPipeline
+from polling import AdaptivePoller
+from prefilter import MarketPrefilter
+from recipients import RecipientIndex
+from render import AlertRenderer
+from scheduler import RateScheduler
+from sender import AlertSender
+from shard import ShardMembership
+from sqlite_cache import SQLiteCache
+from tickers import Ticker
+from transport import AsyncHTTPTransport
+from universe import CoinUniverse
 
 
 def main():
     func_name = inspect.currentframe().f_code.co_name
 
     try:
-        logger = logging.getLogger("Global_Parser")
-        logger.setLevel(logging.ERROR)
-        file_handler = logging.FileHandler('arbitoid.log')
-        file_handler.setLevel(logging.INFO)
-        formatter = logging.Formatter('%(asctime)s %(levelname)s: %(message)s', datefmt='%d/%m/%Y %H:%M:%S')
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
-
+        logger = parser_logger()
         cfg = json.load(open('cfg.json', 'r'))
 
-        gecko_api = CoinGeckoAPI(
-            cfg['CoinGecko']['link'], cfg['CoinGecko']['network_fees'], cfg['CoinGecko']['market_fees'],
-            cfg['parse']['headers'], {"https": f"http://{cfg['parse']['proxy']['proxy1']}"}, logger
+        sender = AlertSender(
+            Bot(token=cfg['telegram']['bot']['api_token']), cfg['telegram']['sender']['rate'],
+            cfg['telegram']['sender']['chat_rate'], cfg['telegram']['sender']['retries'],
+            cfg['telegram']['sender']['concurrency'], cfg['telegram']['sender']['max_backoff'],
+            cfg['telegram']['sender']['chats'], logger
+        )
+
+        arbitoid = AsyncArbitoidAPI(cfg['FastAPI']['params'], logger)
+
+        # lives as long as the process, so a spread that persists over sweeps isn't announced every time
+        dedup = AlertDedup(
+            cfg['parse']['pipeline']['dedup']['cooldown'], cfg['parse']['pipeline']['dedup']['bucket'],
+            cfg['parse']['pipeline']['dedup']['size'], logger
         )
 
-        tele_bot = TeleBot(cfg['telegram']['bot']['api_token'])
+        # several hosts may run the parser, the one holding the advisory lock works and the others wait warm
+        lease = LeaderLease(
+            DatabaseConnector(cfg['database']['params'], logger), cfg['parse']['leader']['key'],
+            cfg['parse']['leader']['keepalive'], cfg['parse']['leader']['retry'], logger
+        ) if cfg['parse']['leader']['enabled'] else None
+
+        proxies = cfg['parse']['shards']['proxies']
+
+        if len(proxies) > 1:
+            asyncio.run(supervise_shards(arbitoid, sender, dedup, cfg, lease, logger))
 
-        arbitoid = ArbitoidAPI(cfg['FastAPI']['params'], logger)
+        else:
+            gecko_api = gecko_client(cfg, proxies[0] if proxies else 'proxy1', logger)
 
-        parser_top_coins(arbitoid, gecko_api, tele_bot, logger)
+            asyncio.run(parser_top_coins(
+                arbitoid, gecko_api, coin_universe(cfg, gecko_api, logger), sender, dedup,
+                cfg['parse']['pipeline'], cfg['parse']['daemon'], lease, logger
+            ))
 
     except Exception as error:
         logging.error(f"{func_name}/{error.__class__}||{error.args[0]}")
         quit()
 
 
-def parser_top_coins(arbitoid: ArbitoidAPI, gecko_api: CoinGeckoAPI, tele_bot: TeleBot, logger=None):
+def parser_logger() -> logging.Logger:
+    logger = logging.getLogger("Global_Parser")
+    logger.setLevel(logging.ERROR)
+    file_handler = logging.FileHandler('arbitoid.log')
+    file_handler.setLevel(logging.INFO)
+    formatter = logging.Formatter('%(asctime)s %(levelname)s: %(message)s', datefmt='%d/%m/%Y %H:%M:%S')
+    file_handler.setFormatter(formatter)
+    logger.addHandler(file_handler)
+
+    return logger
+
+
+def gecko_client(cfg: dict, proxy: str, logger=None) -> AsyncCoinGeckoAPI:
+    # one proxy per process: its own pools, rate budget and coin cache
+    AsyncCoinGeckoAPI.set_transport(AsyncHTTPTransport(
+        cfg['parse']['transport']['pool_size'], cfg['parse']['transport']['timeout'],
+        cfg['parse']['transport']['concurrency'], logger
+    ))
+
+    scheduler = RateScheduler(
+        cfg['parse']['rate_limit']['rpm'], cfg['parse']['rate_limit']['burst'],
+        cfg['parse']['rate_limit']['max_backoff'], cfg['parse']['rate_limit']['retries'], logger
+    )
+
+    store = SQLiteCache(
+        cfg['CoinGecko']['store']['path'], cfg['CoinGecko']['store']['ttl'], cfg['CoinGecko']['store']['size_mb'],
+        cfg['CoinGecko']['store']['timeout'], cfg['CoinGecko']['store']['touch'], logger
+    ) if cfg['CoinGecko']['store']['enabled'] else None
+
+    return AsyncCoinGeckoAPI(
+        cfg['CoinGecko']['link'], cfg['CoinGecko']['network_fees'], cfg['CoinGecko']['market_fees'],
+        cfg['parse']['headers'], {"https": f"http://{cfg['parse']['proxy'][proxy]}"}, logger,
+        TTLCache(cfg['CoinGecko']['cache']['ttl'], cfg['CoinGecko']['cache']['size'], logger),
+        scheduler.bucket({"https": f"http://{cfg['parse']['proxy'][proxy]}"}), store,
+        NegativeCache(
+            cfg['CoinGecko']['negative']['ttl'], cfg['CoinGecko']['negative']['size'], store,
+            cfg['CoinGecko']['negative']['recheck'], logger
+        ) if cfg['CoinGecko']['negative']['enabled'] else None
+    )
+
+
+def coin_universe(cfg: dict, gecko_api: AsyncCoinGeckoAPI, logger=None) -> CoinUniverse:
+    prefilter, polling = cfg['parse']['universe']['prefilter'], cfg['parse']['universe']['polling']
+
+    return CoinUniverse(
+        gecko_api, cfg['parse']['universe']['tiers'], cfg['parse']['universe']['per_page'],
+        cfg['parse']['universe']['refresh'], cfg['parse']['universe']['depth'],
+        MarketPrefilter(
+            prefilter['min_volume'], prefilter['min_range'], prefilter['min_turnover'], logger
+        ) if prefilter['enabled'] else None,
+        AdaptivePoller(
+            polling['quota'], polling['history'], polling['hot'], polling['quiet'], polling['max_backoff'], logger
+        ) if polling['enabled'] else None,
+        logger
+    )
+
+
+async def parser_top_coins(arbitoid: AsyncArbitoidAPI, gecko_api: AsyncCoinGeckoAPI, universe: CoinUniverse,
+                           sender: AlertSender, dedup: AlertDedup, params: dict, daemon: dict,
+                           lease: LeaderLease = None, logger=None):
     func_name = inspect.currentframe().f_code.co_name
 
     try:
-        loc = gecko_api.gecko_loc(2)
+        # ready users are fetched once per sweep (and every recipients_refresh seconds), not once per coin
+        recipients = RecipientIndex(arbitoid, params['recipients_refresh'], logger=logger)
 
-        for step in range(0, len(loc), 10):
-            time.sleep(90)
-            for coin in loc[step:step + 10]:
-                with ThreadPoolExecutor() as executor:
-                    executor.submit(announce, arbitoid, gecko_api, tele_bot, coin, logger)
+        async def prepare():
+            logger.info(f"{func_name}/{dedup.stats}/{sender.stats}/{sender.latency()}") if logger else 0
+            await recipients.refresh()
+
+        await parse_sweeps(
+            gecko_api, universe, partial(announce, recipients, dedup, sender, AlertRenderer(), logger=logger),
+            params, daemon, logger, prepare=prepare,
+            active=lease.ahold if lease else None, standby=lease.retry if lease else 0
+        )
 
     except Exception as error:
         logger.error(f"{func_name}/{error.__class__}||{error.args[0]}") if logger else 0
         return ''
 
     finally:
+        lease.release() if lease else 0
+        await sender.close()
         logger.info(f"{func_name}") if logger else 0
 
 
-def announce(arbitoid: ArbitoidAPI, gecko_api: CoinGeckoAPI, tele_bot: TeleBot, coin: str, logger=None):
+async def parse_sweeps(gecko_api: AsyncCoinGeckoAPI, universe: CoinUniverse, notify, params: dict, daemon: dict,
+                       logger=None, select=None, prepare=None, active=None, standby: float = 0):
+    # select(coins) -> the part of the universe this process scans, prepare() runs before every sweep,
+    # while active() is False the process only keeps its coin list and pools warm and asks again every standby seconds
     func_name = inspect.currentframe().f_code.co_name
 
     try:
-        arb_case = gecko_api.gecko_pairs(coin)
+        # pacing is left to gecko_api.limiter, the workers only keep enough requests in flight to use the quota
+        pipeline = ScanPipeline(
+            gecko_api.gecko_tickers,
+            partial(evaluate, gecko_api, top_k=params['routes'], poller=universe.poller, logger=logger), notify,
+            params['workers'], params['notifiers'], params['queue_size'], logger
+        )
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                # the running sweep stops taking new coins, alerts already found are still sent before we exit
+                loop.add_signal_handler(sig, lambda: (stop.set(), pipeline.stop()))
+
+            except NotImplementedError:
+                pass
+
+        while not stop.is_set():
+            start = time.monotonic()
+            leading = False
+
+            try:
+                # the coin list changes slowly, it is refetched on its own cadence and kept if the refetch fails
+                await universe.ensure_fresh()
+
+                leading = active is None or await active()
+
+                if leading:
+                    await prepare() if prepare else 0
+                    await pipeline.run(universe.due(select))
+
+            except Exception as error:
+                logger.error(f"{func_name}/{error.__class__}||{error.args[0]}") if logger else 0
+
+            if not daemon['enabled']:
+                break
+
+            try:
+                pause = daemon['sweep_interval'] - (time.monotonic() - start) if leading else standby
+                await asyncio.wait_for(stop.wait(), max(0, pause))
+
+            except asyncio.TimeoutError:
+                pass
+
+    finally:
+        await AsyncCoinGeckoAPI.close()
+        logger.info(f"{func_name}") if logger else 0
+
+
+def shard_worker(index: int, proxy: str, cfg: dict, heartbeats, leading, alerts: multiprocessing.Queue):
+    # entry point of a parser process started by supervise_shards, scans its part of the universe through its proxy
+    func_name = inspect.currentframe().f_code.co_name
+
+    try:
+        logger = parser_logger()
+        gecko_api = gecko_client(cfg, proxy, logger)
+
+        membership = ShardMembership(
+            index, heartbeats, cfg['parse']['shards']['timeout'], cfg['parse']['shards']['replicas']
+        )
+
+        asyncio.run(shard_sweeps(
+            gecko_api, coin_universe(cfg, gecko_api, logger), membership, leading, alerts, cfg, logger
+        ))
+
+    except Exception as error:
+        logging.error(f"{func_name}/{index}/{error.__class__}||{error.args[0]}")
+        quit(1)
+
+
+async def shard_sweeps(gecko_api: AsyncCoinGeckoAPI, universe: CoinUniverse, membership: ShardMembership, leading,
+                       alerts: multiprocessing.Queue, cfg: dict, logger=None):
+    async def heartbeat():
+        while 1:
+            membership.beat()
+            await asyncio.sleep(cfg['parse']['shards']['heartbeat'])
+
+    async def active():
+        # the supervisor holds the leader lease for all its workers and publishes it in a shared flag
+        return bool(leading.value)
+
+    async def forward(*opportunity):
+        # dedup and sending happen once, in the supervisor, for all the shards
+        alerts.put(opportunity)
+
+    beating = asyncio.create_task(heartbeat())
+
+    try:
+        # the ring is rebuilt from the heartbeats before every sweep, so coins of a dead worker move to the others
+        await parse_sweeps(
+            gecko_api, universe, forward, cfg['parse']['pipeline'], cfg['parse']['daemon'], logger,
+            select=membership.select,
+            active=active, standby=cfg['parse']['shards']['heartbeat']
+        )
+
+    finally:
+        beating.cancel()
+        membership.leave()
+
 
+def next_alert(alerts: multiprocessing.Queue, timeout: float = 1):
+    try:
+        return alerts.get(timeout=timeout)
+
+    except queue.Empty:
+        return None
+
+
+async def supervise_shards(arbitoid: AsyncArbitoidAPI, sender: AlertSender, dedup: AlertDedup, cfg: dict,
+                           lease: LeaderLease = None, logger=None):
+    # one parser process per proxy in parse.shards.proxies, this process only runs the shared dedup/notify stage
+    func_name = inspect.currentframe().f_code.co_name
+    shards, params = cfg['parse']['shards'], cfg['parse']['pipeline']
+
+    context = multiprocessing.get_context('spawn')
+    heartbeats = context.Array('d', len(shards['proxies']), lock=False)
+    leading = context.Value('b', 0 if lease else 1, lock=False)
+    alerts = context.Queue()
+
+    recipients = RecipientIndex(arbitoid, params['recipients_refresh'], logger=logger)
+    renderer = AlertRenderer()
+
+    workers, died = {}, {}
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+
+    def start_worker(index: int) -> None:
+        workers[index] = context.Process(
+            target=shard_worker, args=(index, shards['proxies'][index], cfg, heartbeats, leading, alerts),
+            name=f"parser-{index}"
+        )
+        workers[index].start()
+
+    async def notifier():
+        while not (stop.is_set() and not any(worker.is_alive() for worker in workers.values())):
+            opportunity = await loop.run_in_executor(None, next_alert, alerts)
+
+            if opportunity is not None:
+                await announce(recipients, dedup, sender, renderer, *opportunity, logger=logger)
+
+        # everything the workers put before exiting is still delivered
+        opportunity = next_alert(alerts, 0)
+
+        while opportunity is not None:
+            await announce(recipients, dedup, sender, renderer, *opportunity, logger=logger)
+            opportunity = next_alert(alerts, 0)
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+
+        except NotImplementedError:
+            pass
+
+    try:
+        for index in range(len(shards['proxies'])):
+            start_worker(index)
+
+        notifiers = [asyncio.create_task(notifier()) for _ in range(params['notifiers'])]
+
+        while not stop.is_set():
+            leading.value = await lease.ahold() if lease else 1
+
+            try:
+                await asyncio.wait_for(stop.wait(), min(shards['heartbeat'], lease.retry if lease else 60))
+
+            except asyncio.TimeoutError:
+                pass
+
+            for index, worker in workers.items():
+                if worker.is_alive() or worker.exitcode == 0:
+                    continue
+
+                # a crashed worker drops out of the ring at once and is restarted one heartbeat later
+                heartbeats[index] = 0
+
+                if index not in died:
+                    died[index] = time.monotonic()
+                    logger.warning(f"{func_name}/{worker.name}/{worker.exitcode}") if logger else 0
+
+                elif time.monotonic() - died[index] >= shards['heartbeat']:
+                    del died[index]
+                    start_worker(index)
+
+            # single sweep mode (parse.daemon.enabled false): done once every worker finished cleanly
+            if all(worker.exitcode == 0 for worker in workers.values()):
+                stop.set()
+
+        for worker in workers.values():
+            worker.terminate() if worker.is_alive() else 0
+
+        for worker in workers.values():
+            await loop.run_in_executor(None, worker.join, cfg['parse']['daemon']['sweep_interval'])
+            worker.kill() if worker.is_alive() else 0
+
+        await asyncio.gather(*notifiers)
+
+    except Exception as error:
+        logger.error(f"{func_name}/{error.__class__}||{error.args[0]}") if logger else 0
+
+    finally:
+        leading.value = 0
+        lease.release() if lease else 0
+        await sender.close()
+        logger.info(f"{func_name}/{dedup.stats}/{sender.stats}/{sender.latency()}") if logger else 0
+
+
+def evaluate(gecko_api: AsyncCoinGeckoAPI, coin: str, tickers: [Ticker], networks: list, top_k: int = 1,
+             poller: AdaptivePoller = None, logger=None) -> list:
+    func_name = inspect.currentframe().f_code.co_name
+
+    try:
+        prices = [ticker.price for ticker in tickers]
+
+        if poller and prices and min(prices) > 0:
+            # raw spread between the cheapest and the dearest market, fees aside, drives how often the coin is polled
+            poller.observe(coin, (max(prices) / min(prices) - 1) * 100, sum(ticker.volume for ticker in tickers))
+
+        # every route of the coin goes through one SpreadMatrix, the best top_k by net profit get announced
+        return [
+            (coin, gecko_api.export_case(case), total_profit)
+            for case, total_profit in gecko_api.spread_cases(tickers, networks, top_k)
+        ]
+
+    except Exception as error:
+        logger.error(f"{func_name}/{error.__class__}||{error.args[0]}") if logger else 0
+        return []
+
+    finally:
+        logger.info(f"{func_name}/{coin}") if logger else 0
+
+
+async def announce(recipients: RecipientIndex, dedup: AlertDedup, sender: AlertSender, renderer: AlertRenderer,
+                   coin: str, arb_case: list, total_profit: list, logger=None):
+    func_name = inspect.currentframe().f_code.co_name
+
+    try:
         if len(arb_case) == 4:
-            market_buy, buy_price, link_buy = \
-                arb_case[0]['market']['name'], arb_case[0]['converted_last']['usd'], arb_case[0]['trade_url']
-            market_sell, sell_price, link_sell = \
-                arb_case[1]['market']['name'], arb_case[1]['converted_last']['usd'], arb_case[1]['trade_url']
-            network, market_fees = arb_case[-1], arb_case[2]
-            total_profit = arbitoid.profit_between_markets(
-                market_buy, arbitoid.reform_float(buy_price),
-                market_sell, arbitoid.reform_float(sell_price),
-                network[-1], market_fees
-            )
-
-            ready_users = arbitoid.get_ready_users['Response']
-
-            for user in ready_users:
-
-                if (user['percent'] and total_profit[0] >= user['percent']) or \
-                        (user['percent'] is None and total_profit[0] >= 3.5):
-                    try:
-                        tele_bot.send_message(
-                            user['id'],
-                            md.text(
-                                f"FOUND ARBITRAGE CASE\n"
-                                f"⸻⸻⸻⸻⸻⸻⸻\n\n"
-                                + md.hitalic("Link to check: ") +
-                                f"https://www.coingecko.com/en/coins/{coin.lower()}#markets" + ' &#9989'
-                                + '\n\n' + "Parameters &#128229/&#128228\n"
-                                + '├Market to buy: ' + md.hbold(market_buy)
-                                + '\n├Market link: \n'
-                                + link_buy[:link_buy.index('?') if '?' in link_buy else len(link_buy)]
-                                + "\n├Price to buy: " + md.hitalic(buy_price)
-                                + '\n├\n├Market to sell: ' + md.hbold(market_sell)
-                                + '\n├Market link: \n'
-                                + link_sell[:link_sell.index('?') if '?' in link_sell else len(link_sell)]
-                                + '\n├Price to sell: ' + md.hitalic(sell_price)
-                                + '\n\nTotal profit &#128184' + "\n├Without fees: " + md.hcode(total_profit[0])
-                                + "\n├Minimal profit: " + md.hcode(total_profit[1])
-                                + "\n├Maximum profit: " + md.hcode(total_profit[-1])
-                                + "\nNetwork: " + md.hbold(network[0])
-                                + "\nFinal result might be lower according to network fees"
-                                + "\n\nData collected by " + "@Arbitroid_bot",
-                                sep='\n',
-                            ),
-                            parse_mode='html',
-                            disable_web_page_preview=True
-                        )
-
-                    except Exception as error:
-                        logger.warning(f"{func_name}/{error.__class__}||{error.args[0]}") if logger else 0
-
-                    finally:
-                        logger.info(f"{func_name}") if logger else 0
+            # users are sorted by their alert %, the ones below total_profit[0] are a prefix found by bisect
+            users = await recipients.recipients(total_profit[0])
+
+            # whoever already got this coin/route in the same profit bucket during the cooldown is skipped
+            users = dedup.pending(coin, arb_case, total_profit, users)
+
+            if users:
+                delivered = {}
+
+                try:
+                    # the same alert for everyone, rendered once and sent to all the chats within Telegram's limits
+                    delivered = await sender.fan_out(
+                        [user['id'] for user in users], renderer.render(coin, arb_case, total_profit, header=True),
+                        parse_mode='html', disable_web_page_preview=True
+                    )
+
+                finally:
+                    # only the chats that actually got it are kept quiet for the cooldown, the claims of the others
+                    # (all of them if the fan-out broke off) are released for the next sweep
+                    dedup.record(
+                        coin, arb_case, total_profit, {user['id']: delivered.get(user['id'], False) for user in users}
+                    )
 
     except Exception as error:
         logger.error(f"{func_name}/{error.__class__}||{error.args[0]}") if logger else 0
@@ -0,0 +1,40 @@
+import asyncio
+import inspect
+
+
+class LeaderLease:
+    # Only the parser holding the Postgres advisory lock `key` scans and sends alerts, the others stay warm standbys.
+    # The lock belongs to a database session: when the leader dies, its session ends and a standby takes over
+
+    def __init__(self, db, key: int = 7305, keepalive: int = 5, retry: float = 2, logger=None):
+        self.db = db
+        self.key = key
+
+        # seconds for the server to notice a dead leader, and between two attempts of a standby to take over
+        self.keepalive = keepalive
+        self.retry = retry
+
+        self.logger = logger
+
+        self.leader = False
+
+    def hold(self) -> bool:
+        # standby: try to take the lock, leader: make sure it is still ours
+        func_name = inspect.currentframe().f_code.co_name
+        was_leader = self.leader
+
+        self.leader = self.db.check_lock(self.key) if was_leader else self.db.try_lock(self.key, self.keepalive)
+
+        if self.leader != was_leader and self.logger:
+            self.logger.warning(f"{func_name}/{'leader' if self.leader else 'standby'}")
+
+        return self.leader
+
+    async def ahold(self) -> bool:
+        # DatabaseConnector is blocking, the parser's event loop keeps running meanwhile
+        return await asyncio.get_running_loop().run_in_executor(None, self.hold)
+
+    def release(self) -> None:
+        if self.leader:
+            self.db.release_lock(self.key)
+            self.leader = False
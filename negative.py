@@ -0,0 +1,70 @@
+import asyncio
+
+from cache import TTLCache
+from sqlite_cache import SQLiteCache
+
+
+# why a coin gives no arbitrage case: CoinGecko doesn't know the id, less than 3 trusted markets on known exchanges,
+# or enough of them but under 1% of the global volume each
+UNKNOWN_ID, FEW_MARKETS, LOW_VOLUME = 'unknown_id', 'few_markets', 'low_volume'
+
+# held in memory for a coin the shared store has no reason for
+HEALTHY = ''
+
+
+class CoinNotFound(KeyError):
+    pass
+
+
+class NegativeCache:
+    # Coins that recently gave no case, with the reason: gecko_pairs/gecko_tickers answer [] for them without fetching.
+    # Every reason has its own ttl, a missing id stays missing longer than a thin market stays thin
+
+    def __init__(self, ttls: dict = None, size: int = 10000, store: SQLiteCache = None, recheck: float = 60,
+                 logger=None):
+        self.ttls = {UNKNOWN_ID: 1800, FEW_MARKETS: 900, LOW_VOLUME: 300, **(ttls or {})}
+
+        # seconds the store's answer (a reason or none) is trusted in memory, so a healthy coin costs a SQLite
+        # lookup once per recheck, not once per sweep
+        self.recheck = recheck
+
+        self.logger = logger
+
+        # in-process entries, plus the host-wide store so the parser and FastAPI learn from each other's misses
+        self.entries = TTLCache(max(self.ttls.values()), size, logger)
+        self.store = store
+
+        self.stats = {reason: 0 for reason in self.ttls}
+
+    def get(self, coin: str) -> str or None:
+        reason = self.entries.get(coin)
+
+        if reason is None and self.store:
+            stored = self.store.get(f"miss:{coin}")
+            reason = stored.decode() if stored is not None else HEALTHY
+
+            self.entries.set(coin, reason, self.recheck)
+
+        if reason:
+            self.stats[reason] = self.stats.get(reason, 0) + 1
+
+        return reason or None
+
+    def set(self, coin: str, reason: str) -> None:
+        self.entries.set(coin, reason, self.ttls[reason])
+        self.store.set(f"miss:{coin}", reason.encode(), self.ttls[reason]) if self.store else 0
+
+        self.logger.info(f"negative/{coin}/{reason}") if self.logger else 0
+
+    async def aget(self, coin: str) -> str or None:
+        # SQLite may wait on another process' write, that wait happens off the event loop, when it happens at all
+        if self.store is None or self.entries.get(coin) is not None:
+            return self.get(coin)
+
+        return await asyncio.get_running_loop().run_in_executor(None, self.get, coin)
+
+    async def aset(self, coin: str, reason: str) -> None:
+        if self.store is None:
+            return self.set(coin, reason)
+
+        await asyncio.get_running_loop().run_in_executor(None, self.set, coin, reason)
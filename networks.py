@@ -0,0 +1,70 @@
+import numpy as np
+
+
+class NetworkIndex:
+    # network_fees from cfg.json ranked once at start-up, choosing a coin's network is then a scan over its platforms.
+    # An entry is either [min %, max %] or {"fees": [min %, max %], "flat_usd": 1, "exchanges": ["Binance", ...]}:
+    # flat_usd is turned into % of the traded amount, exchanges limits the network to routes where both markets have it
+
+    def __init__(self, network_fees: dict, default: str = 'ethereum', amount: float = 1000.0):
+        self.names, self.fees, self.exchanges = [], [], []
+
+        for name, entry in network_fees.items():
+            if isinstance(entry, dict):
+                flat = entry.get('flat_usd', 0) / amount * 100
+                fees = [entry['fees'][0] + flat, entry['fees'][-1] + flat]
+                exchanges = frozenset(entry['exchanges']) if entry.get('exchanges') else None
+            else:
+                fees, exchanges = list(entry), None
+
+            self.names.append(name)
+            self.fees.append([min(fees), max(fees)])
+            self.exchanges.append(exchanges)
+
+        # Firstly, transaction free networks. If there are none, 1$ TRC20 and so on up to ERC-20 (stable on ties)
+        order = sorted(range(len(self.names)), key=lambda i: self.fees[i][-1])
+        self.names = [self.names[i] for i in order]
+        self.fees = [self.fees[i] for i in order]
+        self.exchanges = [self.exchanges[i] for i in order]
+
+        self.rank = {name: i for i, name in enumerate(self.names)}
+        self.default = self.rank.get(default, len(self.names) - 1)
+        self.restricted = any(exchanges is not None for exchanges in self.exchanges)
+
+    def network(self, rank: int) -> tuple:
+        return self.names[rank], self.fees[rank]
+
+    def supports(self, rank: int, exchanges: tuple) -> bool:
+        return self.exchanges[rank] is None or all(exchange in self.exchanges[rank] for exchange in exchanges)
+
+    def select(self, networks: list, exchanges: tuple = ()) -> tuple:
+        best = None
+
+        for name in networks:
+            rank = self.rank.get(name)
+
+            if rank is not None and (best is None or rank < best) and self.supports(rank, exchanges):
+                best = rank
+
+        return self.network(self.default if best is None else best)
+
+    def route_fees(self, networks: list, exchanges: list) -> tuple:
+        # exchange x exchange matrices of (chosen network rank, min fee, max fee), filled from the cheapest network on;
+        # without per-exchange restrictions the first candidate covers every route and the loop stops right there
+        size = len(exchanges)
+        choice = np.full((size, size), self.default)
+        fee_min = np.full((size, size), float(self.fees[self.default][0]))
+        fee_max = np.full((size, size), float(self.fees[self.default][-1]))
+        filled = np.zeros((size, size), dtype=bool)
+
+        for rank in sorted({self.rank[name] for name in networks if name in self.rank}):
+            supported = np.array([self.supports(rank, (exchange,)) for exchange in exchanges], dtype=bool)
+            cells = supported[:, None] & supported[None, :] & ~filled
+
+            choice[cells], fee_min[cells], fee_max[cells] = rank, self.fees[rank][0], self.fees[rank][-1]
+            filled |= cells
+
+            if filled.all():
+                break
+
+        return choice, fee_min, fee_max
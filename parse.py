@@ -1,15 +1,29 @@
 import json
+import time
 import inspect
 from random import choice
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 
 import requests
+import numpy as np
+
+from cache import TTLCache
+from decode import decode_coin, dump_coin, load_coin
+from negative import NegativeCache, CoinNotFound, UNKNOWN_ID, FEW_MARKETS, LOW_VOLUME
+from scheduler import TokenBucket
+from networks import NetworkIndex
+from prefilter import prune_market
+from spread import SpreadMatrix, net_profit
+from sqlite_cache import SQLiteCache
+from tickers import ExchangeIndex, Ticker
+from transport import HTTPTransport, TRANSPORT_ERRORS, DeadlineExceeded, remaining
 
 
 class CoinGeckoAPI:
 
     def __init__(self, link: str, network_fees: dict, market_fees: dict, headers: dict = None, proxy: dict = None,
-                 logger=None):
+                 logger=None, cache: TTLCache = None, limiter: TokenBucket = None, store: SQLiteCache = None,
+                 negative: NegativeCache = None):
         self.link = link
         self.headers = headers
         self.proxy = proxy
@@ -17,15 +31,39 @@ class CoinGeckoAPI:
         # all network fees were represented in percentage form except TRC20 cuz it provides usually a 1$ fee withdrawals
         # Data was collected from ---> https://ycharts.com/indicators/
         self.network_fees = network_fees
+        self.networks = NetworkIndex(network_fees)
 
         # all these fees contain percentage for withdraw(32 fee checks btw)
         self.market_fees = market_fees
+        self.exchanges = ExchangeIndex(market_fees)
 
         self.logger = logger
 
+        # coin documents by id, so gecko_pairs/get_network/global_volume and concurrent callers share one fetch
+        self.cache = cache if cache is not None else TTLCache(logger=logger)
+
+        # requests-per-minute budget of self.proxy, shared with every client on the same proxy (see RateScheduler)
+        self.limiter = limiter
+
+        # pruned coin documents shared with the other processes of the host (parser, FastAPI), checked after self.cache
+        self.store = store
+
+        # coins that gave no case a moment ago and why, answered [] without fetching their document again
+        self.negative = negative
+
+    # shared keep-alive pools for every CoinGecko/FastAPI call, see set_transport to reconfigure
+    transport = HTTPTransport()
+
+    @classmethod
+    def set_transport(cls, transport: HTTPTransport) -> None:
+        cls.transport.close()
+        cls.transport = transport
+
     @classmethod
     def get_response(cls, link: str, req_type: str = "GET", data: dict = None,
-                     headers: dict = None, proxy: dict = None) -> requests.Request or int:
+                     headers: dict = None, proxy: dict = None,
+                     timeout: float or tuple = None, limiter: TokenBucket = None,
+                     deadline: float = None) -> requests.Response or int:
 
         if proxy is None:
             proxy = {}
@@ -37,31 +75,42 @@ class CoinGeckoAPI:
             data = {}
 
         try:
+            req_type = req_type.upper() if req_type.upper() in ("POST", "PUT") else "GET"
 
-            if req_type.upper() == "POST":
-                request = requests.post(
-                    link, params=data,
-                    headers={'user-agent': choice(headers['user_agents'])} if headers else {}, proxies=proxy
-                )
+            # without a limiter (calls to our own FastAPI) the loop runs exactly once
+            for attempt in range(limiter.retries + 1 if limiter else 1):
+                if limiter:
+                    wait = limiter.reserve(deadline)
 
-            elif req_type.upper() == "PUT":
-                request = requests.put(
-                    link, params=data,
-                    headers={'user-agent': choice(headers['user_agents'])} if headers else {}, proxies=proxy
-                )
+                    # the rate budget alone would outlast the caller's deadline, no point in queueing
+                    if wait is None:
+                        raise DeadlineExceeded(link)
 
-            else:
-                request = requests.get(
-                    link,
-                    headers={'user-agent': choice(headers['user_agents'])} if headers else {}, proxies=proxy
+                    time.sleep(wait)
+
+                request = cls.transport.request(
+                    req_type, link, params=data if req_type != "GET" else None,
+                    headers={'user-agent': choice(headers['user_agents'])} if headers else {}, proxy=proxy,
+                    timeout=timeout, deadline=deadline
                 )
 
+                if not limiter or not limiter.feedback(request.status_code, request.headers.get('Retry-After')):
+                    break
+
+            # a definitive answer (no such coin) unlike the -1 of a failed call, worth remembering
+            if request.status_code == 404:
+                raise CoinNotFound(link)
+
             if request.status_code != 200:
                 return -1
 
             return request
 
-        except requests.exceptions.RequestException as error:
+        except TRANSPORT_ERRORS as error:
+            # a timeout cut short by the deadline is the deadline's, not a broken proxy's
+            if deadline is not None and time.monotonic() >= deadline:
+                raise DeadlineExceeded(link) from error
+
             return -1
 
     '''             
@@ -86,27 +135,55 @@ class CoinGeckoAPI:
         finally:
             self.logger.info(f"{func_name}/{coin}") if self.logger else 0
 
+    def load_coin_stats(self, coin: str, deadline: float = None) -> dict:
+        stored = self.store.get(f"coin:{coin}") if self.store else None
+
+        if stored is not None:
+            return load_coin(stored)
+
+        link_to_parse = self.get_coin_link(coin)
+        response = self.get_response(
+            link=link_to_parse, headers=self.headers, proxy=self.proxy, limiter=self.limiter, deadline=deadline
+        )
+
+        # only the fields the arbitrage logic reads are kept, that is also what the caches hold
+        coin_stats = decode_coin(response.content)
+        self.store.set(f"coin:{coin}", dump_coin(coin_stats)) if self.store else 0
+
+        return coin_stats
+
+    def coin_stats(self, coin: str, deadline: float = None) -> dict:
+        # the single-flight leader loads with its own deadline: a follower with budget left that gets the leader's
+        # DeadlineExceeded loads again with its own (or waits on the next leader) instead of failing with it
+        while True:
+            timeout, loaded = remaining(deadline), []
+
+            try:
+                return self.cache.get_or_load(
+                    coin, lambda: loaded.append(True) or self.load_coin_stats(coin, deadline), timeout
+                )
+
+            # first: since 3.11 FutureTimeout is the builtin TimeoutError, DeadlineExceeded's base
+            except DeadlineExceeded:
+                if loaded:
+                    raise
+
+            except FutureTimeout as error:
+                raise DeadlineExceeded(coin) from error
+
+    def select_network(self, networks: list, exchanges: tuple = ()) -> tuple:
+        # cheapest of the coin's platforms we know the fee of (ranked once in NetworkIndex), ERC-20 if there are none
+        return self.networks.select(networks, exchanges)
+
     def get_network(self, coin: str or dict = None) -> tuple:
         func_name = inspect.currentframe().f_code.co_name
 
         try:
 
             if type(coin) == str:
-                link_to_parse = self.get_coin_link(coin)
-                response = self.get_response(link=link_to_parse, headers=self.headers, proxy=self.proxy)
-                networks = list(json.loads(response.content)['platforms'].keys())
+                coin = self.coin_stats(coin)
 
-            else:
-                networks = list(coin['platforms'].keys())
-
-            # Firstly, we check transaction free networks. If it doesn't exist, we check 1$ TRC20. If not, return ERC-20
-
-            available_networks = dict(sorted({
-                key: self.network_fees[key] for key in (set(networks) & set(self.network_fees.keys()))
-            }.items(), key=lambda x: x[1][-1]))
-
-            return list(available_networks.items())[0] if available_networks \
-                else ('ethereum', self.network_fees['ethereum'])
+            return self.select_network(list(coin['platforms'].keys()))
 
         except Exception as error:
             self.logger.error(f"{func_name}/{error.__class__}||{error.args[0]}") if self.logger else 0
@@ -122,14 +199,10 @@ class CoinGeckoAPI:
         try:
 
             if type(coin) == str:
-                link_to_parse = self.get_coin_link(coin)
-                response = self.get_response(link=link_to_parse, headers=self.headers, proxy=self.proxy)
-                volume = json.loads(response.content)['market_data']['total_volume']['usd']
+                coin = self.coin_stats(coin)
 
-            else:
-                volume = coin['market_data']['total_volume']['usd']
+            return coin['market_data']['total_volume']['usd']
 
-            return volume
         except Exception as error:
             self.logger.error(f"{func_name}/{error.__class__}||{error.args[0]}") if self.logger else 0
             return -1
@@ -137,54 +210,108 @@ class CoinGeckoAPI:
         finally:
             self.logger.info(f"{func_name}/{coin}") if self.logger else 0
 
-    @classmethod
-    def sel_sort(cls, array: [dict]) -> list:
-        for i in range(len(array) - 1):
-            m = i
-            j = i + 1
-            while j < len(array):
-                if float(array[j]["converted_last"]["usd"]) < float(array[m]["converted_last"]["usd"]):
-                    m = j
-                j = j + 1
-            array[i], array[m] = array[m], array[i]
-
-        if array[0]['market']["name"] == array[-1]['market']["name"]:
-            c = -1
-            while array[0]['market']["name"] == array[c]['market']["name"]:
-                c -= 1
-            return [array[0], array[c]]
-        return [array[0], array[-1]]
-
-    def gecko_pairs(self, coin: str) -> list:
+    def market_tickers(self, coin_stats: dict) -> tuple:
+        # liquid (>= 1% of the global volume), trusted tickers on exchanges we know the fees of + the coin's platforms,
+        # turned into compact Tickers here once, everything downstream works on them
+        r2_parse = []
+
+        gl_volume = coin_stats['market_data']['total_volume']['usd']
+        networks = list(coin_stats['platforms'].keys())
+
+        for market in coin_stats['tickers']:
+            if market["trust_score"] == "green" and market['market']["name"] in self.exchanges:
+                ticker = Ticker.from_dict(market, self.exchanges)
+
+                if round(ticker.volume / (gl_volume / 100), 2) >= 1:
+                    r2_parse.append(ticker)
+
+        return r2_parse, networks
+
+    def miss_reason(self, coin_stats: dict, r2_parse: list) -> str or None:
+        # why market_tickers left less than 3 tickers; None when it didn't (no pair then is about spreads, not kept)
+        if len(r2_parse) > 2:
+            return None
+
+        trusted = sum(
+            market["trust_score"] == "green" and market['market']["name"] in self.exchanges
+            for market in coin_stats['tickers']
+        )
+
+        return LOW_VOLUME if trusted > 2 else FEW_MARKETS
+
+    def with_fees(self, pair: list, network: tuple) -> list:
+        # [buy, sell] -> [buy, sell, {market: fee}, network], the layout every consumer of gecko_pairs expects
+        pair.append({self.exchanges.names[ticker.exchange]: self.exchanges.fees[ticker.exchange].item()
+                     for ticker in pair})
+        pair.append(network)
+        return pair
+
+    def export_case(self, case: list) -> list:
+        # Tickers back to (trimmed) CoinGecko dicts, only done for the cases that leave the process or get announced
+        return [ticker.as_dict(self.exchanges) for ticker in case[:2]] + case[2:]
+
+    def spread_cases(self, tickers: [Ticker], networks: list, top_k: int = 1, amount: float = 1000.0) -> [tuple]:
+        # every exchange x exchange route evaluated at once, the top_k by net profit come back as (case, total_profit)
+        matrix = SpreadMatrix.from_tickers(tickers, self.exchanges, self.networks, networks, amount)
+
+        return [
+            (self.with_fees([matrix.buy_tickers[i], matrix.sell_tickers[j]], matrix.network(i, j)), matrix.profit(i, j))
+            for i, j in matrix.ranked(top_k)
+        ]
+
+    def arbitrage_cases(self, tickers: [Ticker], networks: list, top_k: int = 1) -> [list]:
+        # pure part of gecko_pairs, shared with AsyncCoinGeckoAPI; ranked by spread_cases like the parser's alerts,
+        # so /pairs and an alert name the same best route of a coin
+        return [self.export_case(case) for case, _ in self.spread_cases(tickers, networks, top_k)]
+
+    def usable_tickers(self, coin: str, deadline: float = None) -> tuple:
+        # (tickers, platforms) of a coin with 3+ usable markets, () otherwise; the negative cache answers for the
+        # coins known to miss and learns the new ones, the reason worked out from the tickers already built
+        if self.negative and self.negative.get(coin):
+            return ()
+
+        try:
+            coin_stats = self.coin_stats(coin, deadline)
+
+        except CoinNotFound:
+            self.negative.set(coin, UNKNOWN_ID) if self.negative else 0
+            return ()
+
+        r2_parse, networks = self.market_tickers(coin_stats)
+
+        if len(r2_parse) > 2:
+            return r2_parse, networks
+
+        self.negative.set(coin, self.miss_reason(coin_stats, r2_parse)) if self.negative else 0
+        return ()
+
+    def gecko_pairs(self, coin: str, deadline: float = None) -> list:
+        # deadline (time.monotonic()) bounds the whole fetch, DeadlineExceeded reaches the caller instead of []
         func_name = inspect.currentframe().f_code.co_name
 
         try:
-            link_to_parse = self.get_coin_link(coin)
-            response = self.get_response(link=link_to_parse, headers=self.headers, proxy=self.proxy)
-
-            coin_stats = json.loads(response.content)
-            r2_parse = []
-
-            gl_volume = self.global_volume(coin_stats)
-            network = self.get_network(coin_stats)
-
-            for market in coin_stats['tickers']:
-                if round(float(market["converted_volume"]["usd"]) / (gl_volume / 100), 2) >= 1 and \
-                        market["trust_score"] == "green" and market['market']["name"] in self.market_fees.keys():
-                    r2_parse.append(market)
-
-            if len(r2_parse) > 2:
-                case = self.sel_sort(r2_parse)
-                market_fees = {
-                    market_fee['market']['name']: self.market_fees[market_fee['market']['name']]
-                    for market_fee in case
-                }
-                case.append(market_fees)
-                case.append(network)
-                return case
+            usable = self.usable_tickers(coin, deadline)
+            cases = self.arbitrage_cases(*usable) if usable else []
 
-            else:
-                return []
+            return cases[0] if cases else []
+
+        except DeadlineExceeded:
+            raise
+
+        except Exception as error:
+            self.logger.error(f"{func_name}/{error.__class__}||{error.args[0]}") if self.logger else 0
+            return []
+
+        finally:
+            self.logger.info(f"{func_name}/{coin}") if self.logger else 0
+
+    def gecko_tickers(self, coin: str) -> list:
+        # [(tickers, platforms)] ready for spread_cases, or [] if the coin has less than 3 usable markets
+        func_name = inspect.currentframe().f_code.co_name
+
+        try:
+            usable = self.usable_tickers(coin)
+            return [usable] if usable else []
 
         except Exception as error:
             self.logger.error(f"{func_name}/{error.__class__}||{error.args[0]}") if self.logger else 0
@@ -199,35 +326,44 @@ class CoinGeckoAPI:
     ----------------------------------------------
     '''
 
-    def input_loc(self, array: list, page: int) -> None:
+    @classmethod
+    def markets_link(cls, page: int, per_page: int = 100) -> str:
+        return f"https://api.coingecko.com/api/v3/coins/markets?vs_currency=usd&order=market_cap_desc" \
+               f"&per_page={per_page}&page={page}"
+
+    def input_loc(self, array: list, page: int, per_page: int = 100, markets: list = None) -> None:
         func_name = inspect.currentframe().f_code.co_name
 
         try:
-            link_to_parse = f"https://api.coingecko.com/api/v3/coins/markets" \
-                            f"?vs_currency=usd&order=market_cap_desc&page={page}"
-            response = self.get_response(link=link_to_parse, headers=self.headers, proxy=self.proxy)
+            link_to_parse = self.markets_link(page, per_page)
+            response = self.get_response(
+                link=link_to_parse, headers=self.headers, proxy=self.proxy, limiter=self.limiter
+            )
 
             loc = json.loads(response.content)
 
             for coin in loc:
                 array.append(coin["id"])
 
+            # the bulk row already tells a lot about the coin (volume, 24h range), kept for the prefilter
+            markets.extend(map(prune_market, loc)) if markets is not None else 0
+
         except Exception as error:
             self.logger.error(f"{func_name}/{error.__class__}||{error.args[0]}") if self.logger else 0
 
         finally:
             self.logger.info(f"{func_name}/{array}/{page}") if self.logger else 0
 
-    def gecko_loc(self, pages: int = 2) -> list:
+    def gecko_loc(self, pages: int = 2, per_page: int = 100) -> list:
         func_name = inspect.currentframe().f_code.co_name
 
         try:
-            r2_u = []
-            for page in range(1, pages + 1):
-                with ThreadPoolExecutor() as executor:
-                    executor.submit(self.input_loc, r2_u, page)
+            # one pool for all the pages, so they are actually fetched side by side and merged in market cap order
+            r2_pages = [[] for _ in range(pages)]
+            with ThreadPoolExecutor(max_workers=pages) as executor:
+                list(executor.map(self.input_loc, r2_pages, range(1, pages + 1), [per_page] * pages))
 
-            return r2_u
+            return [coin for r2_page in r2_pages for coin in r2_page]
 
         except Exception as error:
             self.logger.error(f"{func_name}/{error.__class__}||{error.args[0]}") if self.logger else 0
@@ -235,6 +371,36 @@ class CoinGeckoAPI:
         finally:
             self.logger.info(f"{func_name}/{pages}") if self.logger else 0
 
+    def load_coins(self, pages: int = 2) -> dict:
+        response = self.get_response(
+            link="https://api.coingecko.com/api/v3/coins/list", headers=self.headers, proxy=self.proxy,
+            limiter=self.limiter
+        )
+
+        # [id, symbol, name] of every listed coin, plus the top coins by market cap to rank symbol collisions
+        coins = [[coin['id'], coin['symbol'], coin['name']] for coin in json.loads(response.content)]
+        return {'coins': coins, 'ranked': self.gecko_loc(pages, 250) or []}
+
+    def gecko_coins(self, ttl: float = 3600) -> dict:
+        # the list changes a few times a day, one upstream call per ttl whatever the number of bots asking
+        func_name = inspect.currentframe().f_code.co_name
+
+        try:
+            coins = self.cache.get('coins:list')
+
+            if coins is None:
+                coins = self.load_coins()
+                self.cache.set('coins:list', coins, ttl) if coins['coins'] else 0
+
+            return coins
+
+        except Exception as error:
+            self.logger.error(f"{func_name}/{error.__class__}||{error.args[0]}") if self.logger else 0
+            return {}
+
+        finally:
+            self.logger.info(f"{func_name}") if self.logger else 0
+
 
 class ArbitoidAPI:
 
@@ -247,29 +413,25 @@ class ArbitoidAPI:
                                market_sell_name: str, market_sell_price: float,
                                network_fees: list, market_fees: dict, amount: float = 1000.0) -> list or int:
         try:
-
-            if market_buy_name not in market_fees.keys():
-                market_fees[market_buy_name] = 0.1
-            if market_sell_name not in market_fees.keys():
-                market_fees[market_sell_name] = 0.1
+            # unknown exchanges are priced at 0.1% without touching the caller's dict
+            buy_fee, sell_fee = market_fees.get(market_buy_name, 0.1), market_fees.get(market_sell_name, 0.1)
+            network_min, network_max = min(network_fees), max(network_fees)
 
             # unnecessary to try if the parameter below is less than 10%
             profit_without_fees = round(
                 (market_buy_price - market_sell_price) / ((market_buy_price + market_sell_price) / 2) * -100,
                 2)
             # therefore we diversify our final profit according to max and min commission % for withdrawals
-            coins_received = (amount - (amount * (market_fees[market_buy_name] / 100))) / market_buy_price
+            coins_received = (amount - (amount * (buy_fee / 100))) / market_buy_price
 
-            coins_withdrawn_max = coins_received - (min(network_fees) / 100) * coins_received
-            coins_withdrawn_min = coins_received - (max(network_fees) / 100) * coins_received
+            coins_withdrawn_max = coins_received - (network_min / 100) * coins_received
+            coins_withdrawn_min = coins_received - (network_max / 100) * coins_received
 
-            sell_coins_max = (coins_withdrawn_max * market_sell_price) - (
-                    coins_withdrawn_max * (market_fees[market_sell_name] / 100))
-            sell_coins_min = (coins_withdrawn_min * market_sell_price) - (
-                    coins_withdrawn_min * (market_fees[market_sell_name] / 100))
+            sell_coins_max = (coins_withdrawn_max * market_sell_price) - (coins_withdrawn_max * (sell_fee / 100))
+            sell_coins_min = (coins_withdrawn_min * market_sell_price) - (coins_withdrawn_min * (sell_fee / 100))
 
-            coins_to_wallet_max = sell_coins_max - (min(network_fees) / 100) * sell_coins_max
-            coins_to_wallet_min = sell_coins_min - (max(network_fees) / 100) * sell_coins_min
+            coins_to_wallet_max = sell_coins_max - (network_min / 100) * sell_coins_max
+            coins_to_wallet_min = sell_coins_min - (network_max / 100) * sell_coins_min
 
             profit_with_fees_max = round(((coins_to_wallet_max - amount) / ((coins_to_wallet_max + amount) / 2)),
                                          2) * 100
@@ -282,6 +444,18 @@ class ArbitoidAPI:
         except Exception as error:
             return -1
 
+    @classmethod
+    def profit_between_markets_batch(cls, buy_prices, sell_prices, buy_fees, sell_fees, network_min, network_max,
+                                     amounts=1000.0) -> np.ndarray:
+        # profit_between_markets for thousands of routes at once, every argument is an array (or a scalar for all),
+        # fees are in % like market_fees/network_fees, returns an (n, 3) array of [without_fees, min, max] rows
+        return np.column_stack(np.broadcast_arrays(*net_profit(
+            np.asarray(buy_prices, dtype=float), np.asarray(sell_prices, dtype=float),
+            np.asarray(buy_fees, dtype=float), np.asarray(sell_fees, dtype=float),
+            np.asarray(network_min, dtype=float), np.asarray(network_max, dtype=float),
+            np.asarray(amounts, dtype=float)
+        )))
+
     @classmethod
     def reform_float(cls, number) -> float:
         try:
@@ -302,11 +476,30 @@ class ArbitoidAPI:
     ----------------------------------------------
     '''
 
-    def gecko_pairs(self, coin: str) -> dict:
+    def gecko_pairs(self, coin: str, budget: float = None) -> dict:
+        # budget: seconds FastAPI may spend on CoinGecko, our own wait gets a second more for the hop
+        func_name = inspect.currentframe().f_code.co_name
+
+        try:
+            link_to_parse = f"{self.api_link}/arbitoid/{func_name}/{coin}" + (f"?budget={budget}" if budget else "")
+            response = CoinGeckoAPI.get_response(link_to_parse, timeout=budget + 1 if budget else None)
+
+            json_response = json.loads(response.content)
+
+            return json_response
+
+        except Exception as error:
+            self.logger.error(f"{func_name}/{error.__class__}||{error.args[0]}") if self.logger else 0
+            return {}
+
+        finally:
+            self.logger.info(f"{func_name}") if self.logger else 0
+
+    def gecko_coins(self) -> dict:
         func_name = inspect.currentframe().f_code.co_name
 
         try:
-            link_to_parse = f"{self.api_link}/arbitoid/{func_name}/{coin}"
+            link_to_parse = f"{self.api_link}/arbitoid/{func_name}"
             response = CoinGeckoAPI.get_response(link_to_parse)
 
             json_response = json.loads(response.content)
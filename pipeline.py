@@ -0,0 +1,102 @@
+import time
+import asyncio
+import inspect
+
+
+class ScanPipeline:
+    # fetch -> evaluate -> notify, every stage is a pool of workers and bounded queues between them give backpressure:
+    # when Telegram is slow the fetchers stop pulling coins instead of piling up opportunities in memory
+
+    def __init__(self, fetch, evaluate, notify, workers: int = 8, notifiers: int = 4, queue_size: int = 32,
+                 logger=None):
+        # async fetch(coin) -> [item], sync evaluate(coin, *item) -> [opportunity tuple], async notify(*opportunity)
+        self.fetch = fetch
+        self.evaluate = evaluate
+        self.notify = notify
+
+        self.workers = workers
+        self.notifiers = notifiers
+        self.queue_size = queue_size
+
+        self.logger = logger
+
+        self.stats = {'coins': 0, 'cases': 0, 'opportunities': 0, 'errors': 0, 'elapsed': 0}
+
+        # set by stop(): coins still waiting are skipped, cases already fetched are evaluated and their alerts sent
+        self.stopping = False
+
+    def stop(self) -> None:
+        self.stopping = True
+
+    async def stage(self, name: str, source: asyncio.Queue, handler, target: asyncio.Queue = None) -> None:
+        while 1:
+            item = await source.get()
+
+            try:
+                # a coin may produce several cases (routes), so handlers hand over lists of items
+                for result in await handler(*item) or ():
+                    await target.put(result)
+
+            except Exception as error:
+                self.stats['errors'] += 1
+                self.logger.error(f"{name}/{error.__class__}||{error.args[0]}") if self.logger else 0
+
+            finally:
+                source.task_done()
+
+    async def fetch_stage(self, coin: str) -> list:
+        if self.stopping:
+            return []
+
+        self.stats['coins'] += 1
+        cases = await self.fetch(coin)
+
+        self.stats['cases'] += len(cases)
+        return [(coin, *case) for case in cases]
+
+    async def evaluate_stage(self, coin: str, *case) -> list:
+        opportunities = self.evaluate(coin, *case) or []
+
+        self.stats['opportunities'] += len(opportunities)
+        return opportunities
+
+    async def run(self, coins: list) -> dict:
+        func_name = inspect.currentframe().f_code.co_name
+        start = time.monotonic()
+        self.stats = {'coins': 0, 'cases': 0, 'opportunities': 0, 'errors': 0, 'elapsed': 0}
+
+        coins_queue = asyncio.Queue(self.queue_size)
+        cases_queue = asyncio.Queue(self.queue_size)
+        alerts_queue = asyncio.Queue(self.queue_size)
+
+        tasks = [
+            asyncio.create_task(self.stage("fetch", coins_queue, self.fetch_stage, cases_queue))
+            for _ in range(self.workers)
+        ]
+        tasks.append(asyncio.create_task(self.stage("evaluate", cases_queue, self.evaluate_stage, alerts_queue)))
+        tasks.extend(
+            asyncio.create_task(self.stage("notify", alerts_queue, self.notify))
+            for _ in range(self.notifiers)
+        )
+
+        try:
+            for coin in coins:
+                if self.stopping:
+                    break
+
+                await coins_queue.put((coin,))
+
+            # drain stage by stage, every queue is empty only when everything upstream has been handed over
+            for queue in (coins_queue, cases_queue, alerts_queue):
+                await queue.join()
+
+        finally:
+            for task in tasks:
+                task.cancel()
+
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+            self.stats['elapsed'] = round(time.monotonic() - start, 2)
+            self.logger.info(f"{func_name}/{self.stats}") if self.logger else 0
+
+        return self.stats
@@ -0,0 +1,92 @@
+import zlib
+import inspect
+from collections import deque
+from statistics import pstdev
+
+
+class AdaptivePoller:
+    # Per-coin polling intervals (in sweeps) driven by the last spreads seen for the coin: a tier sets the base
+    # interval, a widening or jumpy spread shortens it, a flat one stretches it, and at most `quota` coins go per sweep
+
+    def __init__(self, quota: int = 250, history: int = 8, hot: float = 2.0, quiet: float = 0.5,
+                 max_backoff: float = 4, logger=None):
+        self.quota = quota
+        self.history_size = history
+
+        # spread % (max/min ticker price) above which a coin is hot, below which it is quiet
+        self.hot = hot
+        self.quiet = quiet
+        self.max_backoff = max_backoff
+
+        self.logger = logger
+
+        self.history = {}
+        self.last = {}
+
+        # consecutive quiet observations of every coin, any other observation starts it over
+        self.streaks = {}
+
+    def observe(self, coin: str, spread: float, volume: float) -> None:
+        if coin not in self.history:
+            self.history[coin] = deque(maxlen=self.history_size)
+
+        self.history[coin].append((spread, volume))
+
+        heat = self.heat(coin)
+        self.streaks[coin] = self.streaks.get(coin, 0) + 1 if heat <= self.quiet else 0
+
+    def heat(self, coin: str) -> float or None:
+        # current spread, plus how much it moves and how fast it is widening; None until the coin has a history
+        history = self.history.get(coin)
+
+        if not history:
+            return None
+
+        spreads = [spread for spread, _ in history]
+        return spreads[-1] + pstdev(spreads) + max(0.0, spreads[-1] - spreads[0])
+
+    def interval(self, coin: str, every: int) -> float:
+        heat = self.heat(coin)
+
+        if heat is None:
+            return every
+
+        if heat >= self.hot:
+            return max(1.0, every / 2 * self.hot / heat)
+
+        if heat <= self.quiet and self.streaks.get(coin, 0) > 1:
+            # the longer it stays flat the further it backs off, up to max_backoff times the tier interval
+            return every * min(self.max_backoff, 2 ** (self.streaks[coin] // 2))
+
+        return every
+
+    def plan(self, candidates: list, sweep: int, scores: dict = None) -> list:
+        # candidates are (coin, tier interval); overdue coins first, the hottest of them first, `quota` at most
+        func_name = inspect.currentframe().f_code.co_name
+        due = []
+
+        for coin, every in candidates:
+            if coin not in self.last:
+                # a new coin gets a slot of its tier's rotation, not all of them at once
+                self.last[coin] = sweep - 1 - zlib.crc32(coin.encode()) % every
+
+            urgency = (sweep - self.last[coin]) / self.interval(coin, every)
+
+            if urgency >= 1:
+                due.append((urgency * (1 + (self.heat(coin) or (scores or {}).get(coin, 0))), coin))
+
+        due.sort(reverse=True)
+        coins = [coin for _, coin in due[:self.quota]]
+
+        for coin in coins:
+            self.last[coin] = sweep
+
+        # coins that left the universe don't keep their history forever
+        if len(self.last) > 2 * len(candidates):
+            alive = {coin for coin, _ in candidates}
+            self.last = {coin: last for coin, last in self.last.items() if coin in alive}
+            self.history = {coin: history for coin, history in self.history.items() if coin in alive}
+            self.streaks = {coin: streak for coin, streak in self.streaks.items() if coin in alive}
+
+        self.logger.info(f"{func_name}/{sweep}/{len(coins)}/{len(due)}") if self.logger else 0
+        return coins
@@ -0,0 +1,55 @@
+import inspect
+
+
+# the /coins/markets fields the prefilter reads, the rest of a row (images, ath, roi...) isn't kept
+MARKET_FIELDS = ('id', 'current_price', 'market_cap', 'total_volume', 'high_24h', 'low_24h',
+                 'price_change_percentage_24h')
+
+
+def prune_market(market: dict) -> dict:
+    return {field: market.get(field) for field in MARKET_FIELDS}
+
+
+class MarketPrefilter:
+    # Decides from one bulk /coins/markets row whether a coin deserves the expensive /coins/{id}?tickers=true call:
+    # too little volume can't pass the ticker filters of market_tickers, a flat 24h range rarely leaves a spread
+
+    def __init__(self, min_volume: float = 100000, min_range: float = 1.5, min_turnover: float = 0.05, logger=None):
+        # 24h volume in $, 24h high/low range in %, 24h volume / market cap
+        self.min_volume = min_volume
+        self.min_range = min_range
+        self.min_turnover = min_turnover
+
+        self.logger = logger
+
+        self.stats = {'kept': 0, 'dropped': 0}
+
+    @classmethod
+    def range_pct(cls, market: dict) -> float:
+        high, low = market.get('high_24h'), market.get('low_24h')
+        return (high - low) / low * 100 if high and low else 0
+
+    @classmethod
+    def turnover(cls, market: dict) -> float:
+        volume, market_cap = market.get('total_volume'), market.get('market_cap')
+        return volume / market_cap if volume and market_cap else 0
+
+    def score(self, market: dict) -> float:
+        # the wider the day's range and the faster the coin changes hands, the likelier exchanges disagree on it
+        return max(self.range_pct(market), abs(market.get('price_change_percentage_24h') or 0)) * \
+            (1 + self.turnover(market))
+
+    def passes(self, market: dict) -> bool:
+        if (market.get('total_volume') or 0) < self.min_volume:
+            return False
+
+        return self.range_pct(market) >= self.min_range or self.turnover(market) >= self.min_turnover
+
+    def select(self, markets: list) -> list:
+        func_name = inspect.currentframe().f_code.co_name
+
+        coins = [market['id'] for market in markets if self.passes(market)]
+        self.stats = {'kept': len(coins), 'dropped': len(markets) - len(coins)}
+
+        self.logger.info(f"{func_name}/{self.stats}") if self.logger else 0
+        return coins
@@ -0,0 +1,89 @@
+import time
+import asyncio
+import inspect
+from bisect import bisect_right
+
+
+class RecipientIndex:
+    # Snapshot of get_ready_users sorted by alert threshold: the recipients of an opportunity are a prefix of it
+
+    def __init__(self, arbitoid, refresh: float = 60, default_percent: float = 3.5, logger=None):
+        self.arbitoid = arbitoid
+
+        # seconds a snapshot is trusted, users switching alerts/percent in the bot show up within this delay
+        self.refresh_interval = refresh
+        self.default_percent = default_percent
+
+        self.logger = logger
+
+        self.thresholds = []
+        self.users = []
+
+        # None until the first load, so the first sweep always fetches users whatever the machine's uptime
+        self.updated = None
+
+        # created on first use, so it belongs to the loop the parser runs in
+        self._lock = None
+
+    def __len__(self) -> int:
+        return len(self.users)
+
+    def threshold(self, user: dict) -> float or None:
+        # same rule the per-user check in announce had: no percent -> 3.5%, percent 0 -> never alerted
+        if user['percent']:
+            return user['percent']
+
+        return self.default_percent if user['percent'] is None else None
+
+    def load(self, users: list) -> None:
+        ranked = sorted(
+            ((self.threshold(user), user) for user in users if self.threshold(user) is not None),
+            key=lambda pair: pair[0]
+        )
+
+        self.thresholds = [threshold for threshold, _ in ranked]
+        self.users = [user for _, user in ranked]
+        self.updated = time.monotonic()
+
+    async def refresh(self) -> bool:
+        func_name = inspect.currentframe().f_code.co_name
+
+        try:
+            users = (await self.arbitoid.get_ready_users)['Response']
+
+            # FastAPI answers -1 when the query failed, keep serving the previous snapshot then
+            if not isinstance(users, list):
+                return False
+
+            self.load(users)
+            return True
+
+        except Exception as error:
+            self.logger.error(f"{func_name}/{error.__class__}||{error.args[0]}") if self.logger else 0
+            return False
+
+        finally:
+            self.logger.info(f"{func_name}/{len(self.users)}") if self.logger else 0
+
+    def stale(self) -> bool:
+        return self.updated is None or time.monotonic() - self.updated >= self.refresh_interval
+
+    async def ensure_fresh(self) -> None:
+        if not self.stale():
+            return
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        # one refresh for all the notifiers that noticed the snapshot got stale at the same moment
+        async with self._lock:
+            if self.stale() and not await self.refresh():
+                # failed refresh: retry in a few seconds instead of hammering FastAPI from every notifier
+                self.updated = time.monotonic() - self.refresh_interval + min(5, self.refresh_interval)
+
+    def match(self, profit: float) -> list:
+        return self.users[:bisect_right(self.thresholds, profit)]
+
+    async def recipients(self, profit: float) -> list:
+        await self.ensure_fresh()
+        return self.match(profit)
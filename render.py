@@ -0,0 +1,64 @@
+import aiogram.utils.markdown as md
+
+from cache import TTLCache
+
+
+ALERT_HEADER = "FOUND ARBITRAGE CASE\n⸻⸻⸻⸻⸻⸻⸻\n\n"
+
+# the layout process_pairs and announce used to rebuild with md.text for every message, formatted once per case now
+ALERT_TEMPLATE = (
+    md.hitalic("Link to check: ") + "https://www.coingecko.com/en/coins/{coin}#markets &#9989"
+    "\n\nParameters &#128229/&#128228\n"
+    "├Market to buy: {market_buy}"
+    "\n├Market link: \n{link_buy}"
+    "\n├Price to buy: {buy_price}"
+    "\n├\n├Market to sell: {market_sell}"
+    "\n├Market link: \n{link_sell}"
+    "\n├Price to sell: {sell_price}"
+    "\n\nTotal profit &#128184\n├Without fees: {without_fees}"
+    "\n├Minimal profit: {profit_min}"
+    "\n├Maximum profit: {profit_max}"
+    "\nNetwork: {network}"
+    "\nFinal result might be lower according to network fees"
+    "\n\nData collected by @Arbitroid_bot"
+)
+
+
+class AlertRenderer:
+    # One html message per arbitrage case, shared by every recipient of the case and by repeated /pairs requests
+
+    def __init__(self, ttl: float = 300, size: int = 1024, logger=None):
+        self.cache = TTLCache(ttl, size, logger)
+
+    @classmethod
+    def strip_query(cls, link: str) -> str:
+        return link[:link.index('?')] if link and '?' in link else link
+
+    @classmethod
+    def case_key(cls, coin: str, arb_case: list, total_profit: list, header: bool = False) -> tuple:
+        # everything the text depends on, [buy ticker, sell ticker, market fees, network] as exported by parse.py
+        buy, sell, network = arb_case[0], arb_case[1], arb_case[-1]
+
+        return (
+            coin.lower(), header,
+            buy['market']['name'], buy['converted_last']['usd'], buy['trade_url'],
+            sell['market']['name'], sell['converted_last']['usd'], sell['trade_url'],
+            network[0], tuple(total_profit)
+        )
+
+    @classmethod
+    def format(cls, key: tuple) -> str:
+        coin, header, market_buy, buy_price, link_buy, market_sell, sell_price, link_sell, network, total_profit = key
+
+        return (ALERT_HEADER if header else '') + ALERT_TEMPLATE.format(
+            coin=coin,
+            market_buy=md.hbold(market_buy), link_buy=cls.strip_query(link_buy), buy_price=md.hitalic(buy_price),
+            market_sell=md.hbold(market_sell), link_sell=cls.strip_query(link_sell),
+            sell_price=md.hitalic(sell_price),
+            without_fees=md.hcode(total_profit[0]), profit_min=md.hcode(total_profit[1]),
+            profit_max=md.hcode(total_profit[-1]), network=md.hbold(network)
+        )
+
+    def render(self, coin: str, arb_case: list, total_profit: list, header: bool = False) -> str:
+        key = self.case_key(coin, arb_case, total_profit, header)
+        return self.cache.get_or_load(key, lambda: self.format(key))
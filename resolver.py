@@ -0,0 +1,130 @@
+import time
+import asyncio
+import inspect
+from bisect import bisect_left
+from difflib import get_close_matches
+
+
+class CoinResolver:
+    # Local index of the CoinGecko ids, symbols and names (/coins/list): what a user types in /pairs is turned into
+    # a coin id, or rejected with a few suggestions, without any call to FastAPI or CoinGecko
+
+    def __init__(self, arbitoid, refresh: float = 3600, suggestions: int = 3, logger=None):
+        self.arbitoid = arbitoid
+
+        # seconds the index is trusted, new listings show up within this delay
+        self.refresh_interval = refresh
+        self.suggestions = suggestions
+
+        self.logger = logger
+
+        self.ids = set()
+        self.aliases = {}
+        self.keys = []
+        self.rank = {}
+        self.updated = None
+
+        # created on first use, so it belongs to the loop the bot runs in
+        self._lock = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def load(self, coins: list, ranked: list = ()) -> None:
+        # a symbol or a name shared by several coins goes to the biggest one (market cap rank, then shortest id)
+        self.rank = {coin: position for position, coin in enumerate(ranked)}
+        order = sorted(coins, key=lambda coin: self.order(coin[0]), reverse=True)
+
+        aliases = {}
+
+        for coin, symbol, name in order:
+            aliases[symbol.lower()] = coin
+            aliases[name.lower()] = coin
+
+        # an id always stands for itself, even if it also is the symbol of another coin
+        aliases.update((coin, coin) for coin, _, _ in coins)
+
+        self.ids = {coin for coin, _, _ in coins}
+        self.aliases = aliases
+        self.keys = sorted(aliases)
+        self.updated = time.monotonic()
+
+    def order(self, coin: str) -> tuple:
+        return self.rank.get(coin, len(self.rank)), len(coin), coin
+
+    async def refresh(self) -> bool:
+        func_name = inspect.currentframe().f_code.co_name
+
+        try:
+            coins = (await self.arbitoid.gecko_coins())['Response']
+
+            # FastAPI answers {} when CoinGecko failed, keep serving the previous index then
+            if not coins or not coins['coins']:
+                return False
+
+            self.load(coins['coins'], coins['ranked'])
+            return True
+
+        except Exception as error:
+            self.logger.error(f"{func_name}/{error.__class__}||{error.args[0]}") if self.logger else 0
+            return False
+
+        finally:
+            self.logger.info(f"{func_name}/{len(self.ids)}") if self.logger else 0
+
+    def stale(self) -> bool:
+        return self.updated is None or time.monotonic() - self.updated >= self.refresh_interval
+
+    async def ensure_fresh(self) -> None:
+        if not self.stale():
+            return
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            if self.stale() and not await self.refresh():
+                # failed refresh: retry in a minute instead of on every /pairs
+                self.updated = time.monotonic() - self.refresh_interval + min(60, self.refresh_interval)
+
+    def prefixed(self, text: str) -> list:
+        # coin ids of the keys starting with text, biggest coins first
+        coins = set()
+
+        for key in self.keys[bisect_left(self.keys, text):]:
+            if not key.startswith(text):
+                break
+
+            coins.add(self.aliases[key])
+
+        return sorted(coins, key=self.order)
+
+    def match(self, text: str) -> tuple:
+        # (coin id, []) when text names exactly one coin, (None, suggestions) otherwise
+        text = text.strip().lower()
+
+        if text in self.aliases:
+            return self.aliases[text], []
+
+        prefixed = self.prefixed(text) if len(text) > 2 else []
+
+        if len(prefixed) == 1:
+            return prefixed[0], []
+
+        if prefixed:
+            return None, prefixed[:self.suggestions]
+
+        # typos: only keys with the same first letter are compared, difflib over the whole list is too slow
+        pool = self.keys[bisect_left(self.keys, text[:1]):bisect_left(self.keys, text[:1] + '\uffff')]
+        close = get_close_matches(text, pool, self.suggestions, 0.75) if text else []
+
+        return None, list(dict.fromkeys(self.aliases[key] for key in close))
+
+    async def resolve(self, text: str) -> tuple:
+        await self.ensure_fresh()
+
+        # no index (FastAPI or CoinGecko down since start): the text goes to gecko_pairs as before
+        if not self.ids:
+            return text.strip().lower(), []
+
+        return self.match(text)
@@ -0,0 +1,106 @@
+import time
+import inspect
+import threading
+
+
+class TokenBucket:
+
+    def __init__(self, rpm: float = 30, burst: int = 5, max_backoff: float = 300, retries: int = 2, logger=None):
+        # requests per minute we may spend on one proxy and how many of them can go out back to back
+        self.rpm = rpm
+        self.burst = burst
+
+        # 429 handling: Retry-After wins, otherwise exponential pause capped by max_backoff
+        self.max_backoff = max_backoff
+        self.retries = retries
+
+        self.logger = logger
+
+        self.rate = rpm / 60
+        self.tokens = float(burst)
+        self.backoff = 0
+        self.updated = time.monotonic()
+        self.blocked_until = 0
+
+        self._lock = threading.Lock()
+
+    def reserve(self, deadline: float = None) -> float or None:
+        # takes a token right away (the balance may go negative) and returns how long the caller has to wait for it,
+        # so the same bucket paces threads (time.sleep) and coroutines (asyncio.sleep) without holding the lock.
+        # None (and the token left in the bucket) when that wait would end after the caller's deadline
+        with self._lock:
+            now = time.monotonic()
+
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+
+            wait = max(-self.tokens / self.rate if self.tokens < 0 else 0, self.blocked_until - now)
+
+            if deadline is not None and now + wait >= deadline:
+                self.tokens += 1
+                return None
+
+            return wait
+
+    def penalize(self, retry_after: float = None) -> float:
+        func_name = inspect.currentframe().f_code.co_name
+
+        with self._lock:
+            self.backoff = min(self.max_backoff, self.backoff * 2 if self.backoff else 1)
+            pause = min(self.max_backoff, retry_after) if retry_after else self.backoff
+
+            # multiplicative decrease, the quota we were given is obviously smaller than the configured one
+            self.rate = max(self.rpm / 600, self.rate / 2)
+            self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+
+        self.logger.warning(f"{func_name}/{pause}/{round(self.rate * 60, 2)}") if self.logger else 0
+        return pause
+
+    def reward(self) -> None:
+        with self._lock:
+            self.backoff = 0
+
+            # additive increase back to the configured budget, one request per minute per success
+            if self.rate < self.rpm / 60:
+                self.rate = min(self.rpm / 60, self.rate + 1 / 60)
+
+    def feedback(self, status_code: int, retry_after: str = None) -> bool:
+        # True if the request was throttled and is worth retrying once the bucket allows it
+        if status_code == 429:
+            try:
+                retry_after = float(retry_after) if retry_after else None
+
+            except ValueError:
+                retry_after = None
+
+            self.penalize(retry_after)
+            return True
+
+        if status_code < 500:
+            self.reward()
+
+        return False
+
+
+class RateScheduler:
+
+    def __init__(self, rpm: float = 30, burst: int = 5, max_backoff: float = 300, retries: int = 2, logger=None):
+        self.rpm = rpm
+        self.burst = burst
+        self.max_backoff = max_backoff
+        self.retries = retries
+        self.logger = logger
+
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, proxy: dict = None) -> TokenBucket:
+        # CoinGecko limits per IP, so every proxy gets its own budget and clients on the same proxy share it
+        key = tuple(sorted(proxy.items())) if proxy else ()
+
+        with self._lock:
+            if key not in self._buckets:
+                self._buckets[key] = TokenBucket(self.rpm, self.burst, self.max_backoff, self.retries, self.logger)
+
+            return self._buckets[key]
@@ -0,0 +1,131 @@
+import time
+import asyncio
+import inspect
+from collections import deque
+
+import aiohttp
+from aiogram import Bot
+from aiogram.utils.exceptions import RetryAfter, NetworkError, RestartingTelegram
+
+from cache import TTLCache
+from scheduler import TokenBucket
+
+
+# worth another try: flood control is handled separately, these are the connection level / Telegram side hiccups
+TRANSIENT_ERRORS = (NetworkError, RestartingTelegram, aiohttp.ClientError, asyncio.TimeoutError)
+
+
+class AlertSender:
+    # Async fan-out of one alert to many chats inside Telegram's limits: about 30 messages/s for the whole bot
+    # and 1 message/s per chat, both kept by the TokenBucket the CoinGecko calls already use
+
+    def __init__(self, bot: Bot, rate: float = 30, chat_rate: float = 1, retries: int = 3, concurrency: int = 30,
+                 max_backoff: float = 60, chats: int = 10000, logger=None):
+        self.bot = bot
+
+        self.chat_rate = chat_rate
+        self.retries = retries
+        self.concurrency = concurrency
+        self.max_backoff = max_backoff
+
+        self.logger = logger
+
+        self.limiter = TokenBucket(rate * 60, max(1, int(rate)), max_backoff, retries, logger)
+
+        # per chat buckets of the recently messaged chats only: one idle for twice the longest pause is full again,
+        # a fresh bucket is then the same thing, and the least recent go first past `chats` entries
+        self._chats = TTLCache(max(60, 2 * max_backoff), chats, logger)
+
+        # last delivery latencies (from the moment the alert was handed over), enough for percentiles
+        self.latencies = deque(maxlen=1000)
+        self.stats = {'sent': 0, 'failed': 0, 'retried': 0}
+
+        # created on first use, so it belongs to the loop the parser runs in
+        self._semaphore = None
+
+    def chat_limiter(self, chat_id: int) -> TokenBucket:
+        limiter = self._chats.get(chat_id)
+
+        if limiter is None:
+            limiter = TokenBucket(self.chat_rate * 60, 1, self.max_backoff, self.retries, self.logger)
+
+        # set on every use, so the expiry slides while the chat is being messaged
+        self._chats.set(chat_id, limiter)
+        return limiter
+
+    async def send(self, chat_id: int, text: str, queued: float = None, **kwargs) -> bool:
+        func_name = inspect.currentframe().f_code.co_name
+        queued = queued or time.monotonic()
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+
+        chat_limiter = self.chat_limiter(chat_id)
+
+        for attempt in range(self.retries + 1):
+            await asyncio.sleep(max(self.limiter.reserve(), chat_limiter.reserve()))
+
+            try:
+                async with self._semaphore:
+                    # a flood wait that began while this send slept or queued for the semaphore holds it too
+                    while self.limiter.blocked_until > time.monotonic():
+                        await asyncio.sleep(self.limiter.blocked_until - time.monotonic())
+
+                    await self.bot.send_message(chat_id, text, **kwargs)
+
+                self.limiter.reward()
+                self.latencies.append(time.monotonic() - queued)
+                self.stats['sent'] += 1
+                return True
+
+            except RetryAfter as error:
+                # flood control is per bot, every chat waits retry_after, not only the one that hit it
+                self.limiter.penalize(error.timeout)
+
+            except TRANSIENT_ERRORS as error:
+                self.logger.warning(f"{func_name}/{chat_id}/{error.__class__}") if self.logger else 0
+
+                await asyncio.sleep(min(self.max_backoff, 0.5 * 2 ** attempt))
+
+            except Exception as error:
+                # blocked the bot, deleted the account, chat not found... retrying would not help
+                self.logger.warning(f"{func_name}/{chat_id}/{error.__class__}||{error.args[0]}") if self.logger else 0
+                break
+
+            if attempt < self.retries:
+                self.stats['retried'] += 1
+
+        self.stats['failed'] += 1
+        return False
+
+    async def fan_out(self, chat_ids: list, text: str, **kwargs) -> dict:
+        # {chat id: delivered?}
+        func_name = inspect.currentframe().f_code.co_name
+        queued = time.monotonic()
+
+        try:
+            # every chat goes out at once, the buckets and the semaphore decide who actually waits
+            delivered = await asyncio.gather(*(self.send(chat_id, text, queued, **kwargs) for chat_id in chat_ids))
+            return dict(zip(chat_ids, delivered))
+
+        finally:
+            self.logger.info(f"{func_name}/{len(chat_ids)}/{round(time.monotonic() - queued, 3)}") if self.logger else 0
+
+    def latency(self) -> dict:
+        if not self.latencies:
+            return {'count': 0, 'p50': 0, 'p95': 0, 'max': 0}
+
+        ordered = sorted(self.latencies)
+
+        return {
+            'count': len(ordered),
+            'p50': round(ordered[len(ordered) // 2], 3),
+            'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+            'max': round(ordered[-1], 3)
+        }
+
+    async def close(self) -> None:
+        session = await self.bot.get_session()
+
+        if session:
+            await session.close()
@@ -0,0 +1,79 @@
+import time
+import hashlib
+from bisect import bisect
+
+
+class HashRing:
+    # Consistent hashing of coin ids over parser workers: when a worker joins or leaves,
+    # only the coins of the ring segments it owns move, everybody else keeps their part of the universe
+
+    def __init__(self, nodes: list = (), replicas: int = 64):
+        self.replicas = replicas
+
+        self._points = []
+        self._owners = {}
+
+        for node in nodes:
+            self.add(node)
+
+    @classmethod
+    def point(cls, key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+    def add(self, node: int) -> None:
+        for replica in range(self.replicas):
+            point = self.point(f"{node}:{replica}")
+
+            self._owners[point] = node
+            self._points.insert(bisect(self._points, point), point)
+
+    def remove(self, node: int) -> None:
+        self._points = [point for point in self._points if self._owners[point] != node]
+        self._owners = {point: self._owners[point] for point in self._points}
+
+    def owner(self, key: str) -> int or None:
+        if not self._points:
+            return None
+
+        return self._owners[self._points[bisect(self._points, self.point(key)) % len(self._points)]]
+
+
+class ShardMembership:
+    # Who is alive is read from heartbeats every worker writes into a shared array (multiprocessing.Array('d')),
+    # a worker that stops beating for `timeout` seconds is considered dead and its coins go to the others
+
+    def __init__(self, index: int, heartbeats, timeout: float = 20, replicas: int = 64):
+        self.index = index
+        self.heartbeats = heartbeats
+        self.timeout = timeout
+        self.replicas = replicas
+
+        self._members = None
+        self._ring = None
+
+    def beat(self) -> None:
+        self.heartbeats[self.index] = time.time()
+
+    def leave(self) -> None:
+        # graceful exit, the others take over on their next sweep instead of waiting for the timeout
+        self.heartbeats[self.index] = 0
+
+    def members(self) -> tuple:
+        now = time.time()
+        alive = tuple(i for i, beat in enumerate(self.heartbeats) if now - beat < self.timeout)
+
+        # this worker always counts itself in, even before its first beat is visible
+        return alive if self.index in alive else tuple(sorted(alive + (self.index,)))
+
+    def ring(self) -> HashRing:
+        members = self.members()
+
+        # rebuilt only when somebody joined or died
+        if members != self._members:
+            self._members, self._ring = members, HashRing(members, self.replicas)
+
+        return self._ring
+
+    def select(self, coins: list) -> list:
+        ring = self.ring()
+        return [coin for coin in coins if ring.owner(coin) == self.index]
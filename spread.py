@@ -0,0 +1,111 @@
+import numpy as np
+
+from networks import NetworkIndex
+from tickers import ExchangeIndex, Ticker
+
+
+def round_like_python(values, digits: int = 2):
+    # np.round is rint(x * 10**digits) / 10**digits, close to a tie (1.115) the product's own rounding error can
+    # push it the other way than Python's correctly rounded round(): those few values go through round() itself
+    values = np.asarray(values, dtype=float)
+    rounded = np.round(values, digits, out=np.empty_like(values))
+
+    scaled = values * 10 ** digits
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+
+    if near_tie.any():
+        rounded[near_tie] = [round(value, digits) for value in values[near_tie].tolist()]
+
+    return rounded
+
+
+def net_profit(buy_price, sell_price, buy_fee, sell_fee, network_min, network_max, amount=1000.0) -> tuple:
+    # vectorized twin of ArbitoidAPI.profit_between_markets, every argument may be a scalar or a broadcastable array
+    profit_without_fees = round_like_python((buy_price - sell_price) / ((buy_price + sell_price) / 2) * -100)
+
+    coins_received = (amount - (amount * (buy_fee / 100))) / buy_price
+
+    coins_withdrawn_max = coins_received - (network_min / 100) * coins_received
+    coins_withdrawn_min = coins_received - (network_max / 100) * coins_received
+
+    sell_coins_max = (coins_withdrawn_max * sell_price) - (coins_withdrawn_max * (sell_fee / 100))
+    sell_coins_min = (coins_withdrawn_min * sell_price) - (coins_withdrawn_min * (sell_fee / 100))
+
+    coins_to_wallet_max = sell_coins_max - (network_min / 100) * sell_coins_max
+    coins_to_wallet_min = sell_coins_min - (network_max / 100) * sell_coins_min
+
+    profit_with_fees_max = round_like_python(
+        (coins_to_wallet_max - amount) / ((coins_to_wallet_max + amount) / 2)
+    ) * 100
+    profit_with_fees_min = round_like_python(
+        (coins_to_wallet_min - amount) / ((coins_to_wallet_min + amount) / 2)
+    ) * 100
+
+    return profit_without_fees, profit_with_fees_min, profit_with_fees_max
+
+
+class SpreadMatrix:
+    # Every exchange of a coin against every other one: rows buy (cheapest ticker), columns sell (dearest ticker)
+
+    def __init__(self, exchanges: list, buy_tickers: list, sell_tickers: list, buy_prices: np.ndarray,
+                 sell_prices: np.ndarray, fees: np.ndarray, network_index: NetworkIndex, networks: list,
+                 amount: float = 1000.0):
+        self.exchanges = exchanges
+        self.buy_tickers = buy_tickers
+        self.sell_tickers = sell_tickers
+
+        self.buy_prices = buy_prices
+        self.sell_prices = sell_prices
+        self.fees = fees
+
+        # withdrawal network of every route, the cheapest of the coin's platforms both exchanges support
+        self.network_index = network_index
+        self.network_choice, self.network_min, self.network_max = network_index.route_fees(networks, exchanges)
+        self.amount = amount
+
+        self.without_fees, self.profit_min, self.profit_max = net_profit(
+            buy_prices[:, None], sell_prices[None, :], fees[:, None], fees[None, :],
+            self.network_min, self.network_max, amount
+        )
+
+    @classmethod
+    def from_tickers(cls, tickers: [Ticker], exchanges: ExchangeIndex, network_index: NetworkIndex, networks: list,
+                     amount: float = 1000.0) -> 'SpreadMatrix':
+        index, buy_tickers, sell_tickers, buy_prices, sell_prices = {}, [], [], [], []
+
+        for ticker in tickers:
+            price, i = ticker.price, index.get(ticker.exchange)
+
+            if i is None:
+                i = index[ticker.exchange] = len(buy_tickers)
+                buy_tickers.append(ticker)
+                sell_tickers.append(ticker)
+                buy_prices.append(price)
+                sell_prices.append(price)
+
+            elif price < buy_prices[i]:
+                buy_tickers[i], buy_prices[i] = ticker, price
+
+            elif price > sell_prices[i]:
+                sell_tickers[i], sell_prices[i] = ticker, price
+
+        ids = np.fromiter(index, dtype=int, count=len(index))
+
+        return cls(
+            [exchanges.names[exchange] for exchange in index], buy_tickers, sell_tickers, np.array(buy_prices),
+            np.array(sell_prices), exchanges.fees[ids], network_index, networks, amount
+        )
+
+    def ranked(self, top_k: int = None) -> list:
+        # (buy, sell) index pairs by worst-case net profit, ties broken by the spread without fees
+        score = np.where(np.eye(len(self.exchanges), dtype=bool), -np.inf, self.profit_min)
+        order = np.lexsort((-self.without_fees.ravel(), -score.ravel()))
+        order = order[np.isfinite(score.ravel()[order])]
+
+        return [divmod(int(cell), len(self.exchanges)) for cell in order[:top_k]]
+
+    def profit(self, i: int, j: int) -> list:
+        return [float(self.without_fees[i, j]), float(self.profit_min[i, j]), float(self.profit_max[i, j])]
+
+    def network(self, i: int, j: int) -> tuple:
+        return self.network_index.network(int(self.network_choice[i, j]))
@@ -0,0 +1,116 @@
+import os
+import time
+import sqlite3
+import inspect
+import threading
+
+
+class SQLiteCache:
+    # Byte values with a per-entry ttl in one SQLite file in WAL mode, shared by every process of the host:
+    # readers never block the writer, writers wait for each other up to `timeout` seconds (busy timeout)
+
+    def __init__(self, path: str = 'arbitoid_cache.sqlite3', ttl: float = 30, size_mb: float = 256,
+                 timeout: float = 5, touch: float = 10, logger=None):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = int(size_mb * 1024 * 1024)
+        self.timeout = timeout
+
+        # a hit refreshes its LRU stamp only when older than `touch` seconds: readers stay readers under WAL,
+        # instead of all queueing on the write lock for an UPDATE per hit
+        self.touch = touch
+
+        self.logger = logger
+
+        # sqlite3 connections can't cross threads (nor processes after a fork), each one opens its own
+        self._local = threading.local()
+        self._writes = 0
+
+        self.connection().execute(
+            "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL, "
+            "accessed REAL NOT NULL, size INTEGER NOT NULL)"
+        )
+        self.connection().execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+
+        if connection is None or self._local.pid != os.getpid():
+            # autocommit, every statement is its own short transaction
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+
+            self._local.connection, self._local.pid = connection, os.getpid()
+
+        return connection
+
+    def get(self, key: str) -> bytes or None:
+        func_name = inspect.currentframe().f_code.co_name
+
+        try:
+            now = time.time()
+            row = self.connection().execute(
+                "SELECT value, accessed FROM entries WHERE key = ? AND expires > ?", (key, now)
+            ).fetchone()
+
+            if row is None:
+                return None
+
+            if now - row[1] >= self.touch:
+                self.connection().execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+
+            return row[0]
+
+        except sqlite3.Error as error:
+            # a busy or broken cache is a miss, the caller fetches from upstream
+            self.logger.warning(f"{func_name}/{error.__class__}||{error.args[0]}") if self.logger else 0
+            return None
+
+    def set(self, key: str, value: bytes, ttl: float = None) -> None:
+        func_name = inspect.currentframe().f_code.co_name
+
+        try:
+            now = time.time()
+            self.connection().execute(
+                "INSERT OR REPLACE INTO entries (key, value, expires, accessed, size) VALUES (?, ?, ?, ?, ?)",
+                (key, value, now + (self.ttl if ttl is None else ttl), now, len(value))
+            )
+
+            self._writes += 1
+
+            if self._writes % 32 == 0:
+                self.evict()
+
+        except sqlite3.Error as error:
+            self.logger.warning(f"{func_name}/{error.__class__}||{error.args[0]}") if self.logger else 0
+
+    def pop(self, key: str) -> None:
+        func_name = inspect.currentframe().f_code.co_name
+
+        try:
+            self.connection().execute("DELETE FROM entries WHERE key = ?", (key,))
+
+        except sqlite3.Error as error:
+            self.logger.warning(f"{func_name}/{error.__class__}||{error.args[0]}") if self.logger else 0
+
+    def evict(self) -> None:
+        # expired entries first, then the least recently used ones until the file holds at most max_bytes of values
+        connection = self.connection()
+        connection.execute("DELETE FROM entries WHERE expires <= ?", (time.time(),))
+
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+        if total > self.max_bytes:
+            connection.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM ("
+                "SELECT key, SUM(size) OVER (ORDER BY accessed DESC) AS kept FROM entries) WHERE kept > ?)",
+                (self.max_bytes,)
+            )
+
+    def close(self) -> None:
+        connection = getattr(self._local, 'connection', None)
+
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
@@ -0,0 +1,65 @@
+import os
+import shutil
+import importlib
+
+import pytest
+from fastapi.testclient import TestClient
+
+from transport import DeadlineExceeded
+
+
+@pytest.fixture(scope="module")
+def api(tmp_path_factory):
+    # api.py reads cfg.json and opens its log and SQLite files in the working directory, a scratch one here,
+    # kept for the whole module since the SQLite connections of the worker threads are opened lazily
+    workdir = tmp_path_factory.mktemp("api")
+    shutil.copy(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cfg.json'), workdir)
+
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(workdir)
+        yield importlib.import_module("api")
+
+
+@pytest.fixture
+def client(api):
+    api.last_pairs.clear()
+    return TestClient(api.app)
+
+
+def test_budget_must_be_positive(client):
+    assert client.get("/arbitoid/gecko_pairs/btc", params={'budget': -1}).status_code == 422
+    assert client.get("/arbitoid/gecko_pairs/btc", params={'budget': 0}).status_code == 422
+
+
+def test_stale_answer_is_never_an_empty_one(api, client, monkeypatch):
+    answers = [[], DeadlineExceeded('btc')]
+
+    def gecko_pairs(coin: str, deadline: float = None) -> list:
+        answer = answers.pop(0)
+
+        if isinstance(answer, Exception):
+            raise answer
+
+        return answer
+
+    monkeypatch.setattr(api.gecko_api, 'gecko_pairs', gecko_pairs)
+
+    assert client.get("/arbitoid/gecko_pairs/btc", params={'budget': 2}).json() == {'Response': []}
+    assert client.get("/arbitoid/gecko_pairs/btc", params={'budget': 2}).json() == {'Response': [], 'Timeout': 2}
+
+
+def test_stale_answer_after_a_timeout(api, client, monkeypatch):
+    answers = [['case'], DeadlineExceeded('btc')]
+
+    def gecko_pairs(coin: str, deadline: float = None) -> list:
+        answer = answers.pop(0)
+
+        if isinstance(answer, Exception):
+            raise answer
+
+        return answer
+
+    monkeypatch.setattr(api.gecko_api, 'gecko_pairs', gecko_pairs)
+
+    assert client.get("/arbitoid/gecko_pairs/btc").json() == {'Response': ['case']}
+    assert client.get("/arbitoid/gecko_pairs/btc").json() == {'Response': ['case'], 'Stale': 0}
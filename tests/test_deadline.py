@@ -0,0 +1,89 @@
+import time
+import threading
+
+import pytest
+
+from cache import TTLCache
+from parse import CoinGeckoAPI
+from transport import DeadlineExceeded, HTTPTransport
+
+
+class SlowCoinGeckoAPI(CoinGeckoAPI):
+    # load_coin_stats takes `delay` seconds, or fails as soon as the caller's deadline comes first
+
+    def __init__(self, delay: float):
+        self.cache = TTLCache()
+        self.delay = delay
+        self.loads = []
+
+    def load_coin_stats(self, coin: str, deadline: float = None) -> dict:
+        self.loads.append(deadline)
+
+        if deadline is not None and time.monotonic() + self.delay > deadline:
+            time.sleep(max(0.0, deadline - time.monotonic()))
+            raise DeadlineExceeded(coin)
+
+        time.sleep(self.delay)
+        return {'coin': coin}
+
+
+def test_follower_outlives_the_leaders_deadline():
+    gecko_api = SlowCoinGeckoAPI(0.2)
+    results = {}
+
+    def call(name: str, budget: float):
+        try:
+            results[name] = gecko_api.coin_stats('btc', time.monotonic() + budget)
+
+        except DeadlineExceeded:
+            results[name] = None
+
+    leader = threading.Thread(target=call, args=('leader', 0.1))
+    leader.start()
+    time.sleep(0.02)
+
+    follower = threading.Thread(target=call, args=('follower', 1))
+    follower.start()
+
+    leader.join()
+    follower.join()
+
+    assert results == {'leader': None, 'follower': {'coin': 'btc'}}
+    assert len(gecko_api.loads) == 2
+
+
+def test_follower_stops_at_its_own_deadline():
+    gecko_api = SlowCoinGeckoAPI(0.5)
+    leader = threading.Thread(target=gecko_api.coin_stats, args=('btc',))
+    leader.start()
+    time.sleep(0.02)
+
+    start = time.monotonic()
+
+    with pytest.raises(DeadlineExceeded):
+        gecko_api.coin_stats('btc', time.monotonic() + 0.1)
+
+    assert time.monotonic() - start < 0.3
+    leader.join()
+
+
+class RecordingSession:
+
+    def __init__(self):
+        self.timeouts = []
+
+    def request(self, method: str, link: str, **kwargs):
+        self.timeouts.append(kwargs['timeout'])
+
+
+def test_connect_and_read_share_the_budget():
+    link = 'https://api.coingecko.com/api/v3/coins/btc'
+    transport = HTTPTransport(timeout=(3.05, 15))
+    session = transport._sessions[transport.session_key(link)] = RecordingSession()
+
+    transport.request('get', link, deadline=time.monotonic() + 2)
+    transport.request('get', link, deadline=time.monotonic() + 60)
+
+    (connect, read), unbounded = session.timeouts
+    assert connect <= 1 and connect + read <= 2
+    assert unbounded == (3.05, 15)
@@ -0,0 +1,153 @@
+import asyncio
+
+import time
+
+from aiogram.utils.exceptions import BotBlocked, RetryAfter
+
+from dedup import AlertDedup
+from global_parser import announce
+from sender import AlertSender
+
+
+ARB_CASE = [{'market': {'name': 'Binance'}}, {'market': {'name': 'Bitrue'}}, {'Binance': 0.1}, ('tron', 0, 1)]
+TOTAL_PROFIT = [4.2, 4.0, 4.4]
+
+
+class FakeBot:
+    # send_message fails for the chats in `failing`, once each
+
+    def __init__(self, failing: set = ()):
+        self.failing = set(failing)
+        self.sent = []
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        if chat_id in self.failing:
+            self.failing.discard(chat_id)
+            raise BotBlocked("Forbidden: bot was blocked by the user")
+
+        self.sent.append(chat_id)
+
+
+class SlowBot(FakeBot):
+    # every send takes `delay` seconds, a fan-out to a few chats outlasts a short cooldown
+
+    def __init__(self, delay: float):
+        super().__init__()
+        self.delay = delay
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        await asyncio.sleep(self.delay)
+        await super().send_message(chat_id, text, **kwargs)
+
+
+class FloodBot(FakeBot):
+    # the first send hits flood control, the time of every delivered one is kept
+
+    def __init__(self, retry_after: int):
+        super().__init__()
+        self.retry_after = retry_after
+        self.flooded = None
+        self.times = []
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        if self.flooded is None:
+            self.flooded = time.monotonic()
+            raise RetryAfter(self.retry_after)
+
+        self.times.append(time.monotonic())
+        await super().send_message(chat_id, text, **kwargs)
+
+
+class FakeRecipients:
+
+    def __init__(self, users: list):
+        self.users = users
+
+    async def recipients(self, profit: float) -> list:
+        return self.users
+
+
+class FakeRenderer:
+
+    def render(self, coin: str, arb_case: list, total_profit: list, header: bool = False) -> str:
+        return coin
+
+
+def test_fan_out_reports_every_chat():
+    sender = AlertSender(FakeBot({2}), rate=1000, chat_rate=1000)
+
+    assert asyncio.run(sender.fan_out([1, 2, 3], "alert")) == {1: True, 2: False, 3: True}
+
+
+def test_failed_send_is_retried_on_the_next_announce():
+    bot = FakeBot({2})
+    sender = AlertSender(bot, rate=1000, chat_rate=1000)
+    dedup = AlertDedup(cooldown=900)
+    recipients = FakeRecipients([{'id': 1}, {'id': 2}, {'id': 3}])
+
+    async def sweep():
+        await announce(recipients, dedup, sender, FakeRenderer(), 'btc', ARB_CASE, TOTAL_PROFIT)
+
+    asyncio.run(sweep())
+    assert sorted(bot.sent) == [1, 3]
+
+    # same opportunity on the next sweep: only the chat that didn't get it is sent it
+    asyncio.run(sweep())
+    assert sorted(bot.sent) == [1, 2, 3]
+
+    asyncio.run(sweep())
+    assert sorted(bot.sent) == [1, 2, 3]
+    assert dedup.stats == {'sent': 3, 'suppressed': 5}
+
+
+def test_pending_claims_until_recorded():
+    dedup = AlertDedup(cooldown=900)
+    users = [{'id': 1}, {'id': 2}]
+
+    assert dedup.pending('btc', ARB_CASE, TOTAL_PROFIT, users) == users
+
+    # a concurrent announce of the same case while the first one is still sending
+    assert dedup.pending('btc', ARB_CASE, TOTAL_PROFIT, users) == []
+
+    dedup.record('btc', ARB_CASE, TOTAL_PROFIT, {1: True, 2: False})
+    assert dedup.pending('btc', ARB_CASE, TOTAL_PROFIT, users) == [{'id': 2}]
+
+
+def test_slow_fan_out_keeps_its_claims():
+    bot = SlowBot(0.1)
+    sender = AlertSender(bot, rate=1000, chat_rate=1000, concurrency=1)
+    dedup = AlertDedup(cooldown=0.05)
+    recipients = FakeRecipients([{'id': 1}, {'id': 2}, {'id': 3}])
+
+    async def sweeps():
+        first = asyncio.create_task(
+            announce(recipients, dedup, sender, FakeRenderer(), 'btc', ARB_CASE, TOTAL_PROFIT)
+        )
+
+        # the next sweep sees the same case long after the cooldown, while the first fan-out is still sending
+        await asyncio.sleep(0.15)
+        await announce(recipients, dedup, sender, FakeRenderer(), 'btc', ARB_CASE, TOTAL_PROFIT)
+        await first
+
+    asyncio.run(sweeps())
+    assert sorted(bot.sent) == [1, 2, 3]
+
+
+def test_flood_wait_holds_sends_already_sleeping():
+    bot = FloodBot(1)
+    sender = AlertSender(bot, rate=1000, chat_rate=1000)
+
+    assert all(asyncio.run(sender.fan_out([1, 2, 3, 4, 5], "alert")).values())
+
+    # the other chats were already past their bucket when the first one was told to wait
+    assert sorted(bot.sent) == [1, 2, 3, 4, 5]
+    assert min(bot.times) >= bot.flooded + 1
+
+
+def test_chat_limiters_are_bounded():
+    sender = AlertSender(FakeBot(), rate=1000, chat_rate=1000, chats=100)
+
+    asyncio.run(sender.fan_out(list(range(1000)), "alert"))
+
+    assert len(sender._chats) == 100
+    assert sender.chat_limiter(999) is sender.chat_limiter(999)
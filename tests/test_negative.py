@@ -0,0 +1,86 @@
+import json
+import asyncio
+
+from async_parse import AsyncCoinGeckoAPI
+from negative import NegativeCache, CoinNotFound, UNKNOWN_ID, FEW_MARKETS, LOW_VOLUME
+from sqlite_cache import SQLiteCache
+from transport import AsyncResponse
+
+
+MARKET_FEES = {'Binance': 0.1, 'Bittrex': 0.25, 'Bitrue': 0.2}
+
+
+def ticker(name: str, volume: float) -> dict:
+    return {'market': {'name': name}, 'converted_last': {'usd': 1.0}, 'converted_volume': {'usd': volume},
+            'trust_score': 'green', 'trade_url': ''}
+
+
+DOCUMENTS = {
+    'ghost': None,
+    'thin': {'platforms': {}, 'market_data': {'total_volume': {'usd': 1000}},
+             'tickers': [ticker('Binance', 500), ticker('Bittrex', 400)]},
+    'illiquid': {'platforms': {}, 'market_data': {'total_volume': {'usd': 1e9}},
+                 'tickers': [ticker('Binance', 5), ticker('Bittrex', 4), ticker('Bitrue', 3)]},
+}
+
+
+class CountingStore(SQLiteCache):
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.lookups = 0
+
+    def get(self, key: str) -> bytes or None:
+        self.lookups += 1
+        return super().get(key)
+
+
+def gecko_client(store: SQLiteCache, fetched: list) -> AsyncCoinGeckoAPI:
+    class FakeCoinGeckoAPI(AsyncCoinGeckoAPI):
+
+        @classmethod
+        async def get_response(cls, link: str, **kwargs) -> AsyncResponse:
+            coin = link.split('/coins/')[1].split('?')[0]
+            fetched.append(coin)
+
+            if DOCUMENTS[coin] is None:
+                # what the real get_response raises on a 404
+                raise CoinNotFound(link)
+
+            return AsyncResponse(200, json.dumps(DOCUMENTS[coin]).encode(), {})
+
+    return FakeCoinGeckoAPI(
+        "https://api.coingecko.com/api/v3/coins/___?tickers=true", {}, MARKET_FEES,
+        negative=NegativeCache(store=store)
+    )
+
+
+def test_reasons_are_remembered_and_shared(tmp_path):
+    store, fetched = SQLiteCache(str(tmp_path / 'cache.sqlite3')), []
+    gecko_api = gecko_client(store, fetched)
+
+    async def sweeps():
+        for _ in range(3):
+            for coin in DOCUMENTS:
+                assert await gecko_api.gecko_tickers(coin) == []
+
+    asyncio.run(sweeps())
+
+    assert fetched == ['ghost', 'thin', 'illiquid']
+    assert gecko_api.negative.stats == {UNKNOWN_ID: 2, FEW_MARKETS: 2, LOW_VOLUME: 2}
+
+    # another process on the same host skips them too
+    other = gecko_client(store, fetched)
+    assert asyncio.run(other.gecko_pairs('ghost')) == []
+    assert fetched == ['ghost', 'thin', 'illiquid']
+
+
+def test_healthy_coins_hit_the_store_once_per_recheck(tmp_path):
+    store = CountingStore(str(tmp_path / 'cache.sqlite3'))
+    negative = NegativeCache(store=store, recheck=60)
+
+    async def sweeps():
+        return [await negative.aget('btc') for _ in range(5)]
+
+    assert asyncio.run(sweeps()) == [None] * 5
+    assert store.lookups == 1
@@ -0,0 +1,32 @@
+from polling import AdaptivePoller
+
+
+def test_backoff_follows_the_quiet_streak():
+    poller = AdaptivePoller(history=8, hot=2.0, quiet=0.5, max_backoff=4)
+
+    # a full history of hot spreads, then the coin goes flat
+    for _ in range(8):
+        poller.observe('btc', 3.0, 1e6)
+
+    for _ in range(16):
+        poller.observe('btc', 0.0, 1e6)
+
+    assert poller.interval('btc', 2) == 8
+
+    # one busy sweep starts the streak over: flat again with a full history isn't a backoff yet
+    poller.observe('btc', 1.0, 1e6)
+    poller.observe('btc', 0.0, 1e6)
+
+    assert poller.streaks['btc'] == 1
+    assert poller.interval('btc', 2) == 2
+
+
+def test_quiet_backoff_grows_with_the_streak():
+    poller = AdaptivePoller(history=8, quiet=0.5, max_backoff=4)
+    intervals = []
+
+    for _ in range(6):
+        poller.observe('eth', 0.1, 1e6)
+        intervals.append(poller.interval('eth', 1))
+
+    assert intervals == [1, 2, 2, 4, 4, 4]
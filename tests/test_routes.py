@@ -0,0 +1,62 @@
+import os
+import json
+import random
+from itertools import permutations
+
+from parse import ArbitoidAPI, CoinGeckoAPI
+
+
+with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cfg.json')) as cfg_file:
+    cfg = json.load(cfg_file)
+
+
+def coin_document(rnd: random.Random, exchanges: list) -> dict:
+    # a few tickers per exchange, enough volume everywhere for market_tickers to keep them all
+    return {
+        'platforms': dict.fromkeys(rnd.sample(list(cfg['CoinGecko']['network_fees']), 2), ''),
+        'market_data': {'total_volume': {'usd': 1e6}},
+        'tickers': [
+            {'market': {'name': exchange}, 'converted_last': {'usd': rnd.uniform(0.95, 1.05)},
+             'converted_volume': {'usd': 1e5}, 'trust_score': 'green', 'trade_url': ''}
+            for exchange in exchanges for _ in range(rnd.randint(1, 3))
+        ]
+    }
+
+
+def scalar_routes(gecko_api: CoinGeckoAPI, coin_stats: dict) -> dict:
+    # brute force over every (buy exchange, sell exchange) with the scalar profit formula
+    cheapest, dearest = {}, {}
+
+    for market in coin_stats['tickers']:
+        name, price = market['market']['name'], market['converted_last']['usd']
+        cheapest[name], dearest[name] = min(cheapest.get(name, price), price), max(dearest.get(name, price), price)
+
+    return {
+        (buy, sell): ArbitoidAPI.profit_between_markets(
+            buy, cheapest[buy], sell, dearest[sell],
+            gecko_api.select_network(list(coin_stats['platforms']), (buy, sell))[-1], cfg['CoinGecko']['market_fees']
+        )
+        for buy, sell in permutations(cheapest, 2)
+    }
+
+
+def test_pairs_and_alerts_rank_routes_alike():
+    gecko_api = CoinGeckoAPI(cfg['CoinGecko']['link'], cfg['CoinGecko']['network_fees'],
+                             cfg['CoinGecko']['market_fees'])
+    rnd = random.Random(0)
+
+    for _ in range(200):
+        coin_stats = coin_document(rnd, rnd.sample(list(cfg['CoinGecko']['market_fees']), rnd.randint(3, 8)))
+        tickers, networks = gecko_api.market_tickers(coin_stats)
+
+        # what /pairs answers and what the parser alerts on
+        pairs = gecko_api.arbitrage_cases(tickers, networks, 3)
+        alerts = [(gecko_api.export_case(case), profit) for case, profit in gecko_api.spread_cases(tickers, networks, 3)]
+
+        # the top 3 by worst-case net profit, then by the spread without fees; routes tied on both are
+        # interchangeable, so the ranks are compared by their profits
+        routes = scalar_routes(gecko_api, coin_stats)
+        expected = sorted(routes.values(), key=lambda profit: (-profit[1], -profit[0]))[:3]
+
+        assert [routes[(case[0]['market']['name'], case[1]['market']['name'])] for case in pairs] == expected
+        assert [profit for _, profit in alerts] == expected
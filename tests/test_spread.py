@@ -0,0 +1,50 @@
+import random
+
+import numpy as np
+
+from parse import ArbitoidAPI
+from spread import round_like_python
+
+
+
+FEES = [0.05, 0.1, 0.2, 0.26, 0.4, 1.49]
+NETWORKS = [[0, 0], [0.001, 0.001], [0.1, 0.5], [0.269, 0.573]]
+
+
+def routes(count: int, seed: int = 0) -> list:
+    # the sell price is solved so the spread without fees is a rounding tie (x.xx5 %), where np.round and round()
+    # may disagree, half of the routes are plain random ones
+    rnd = random.Random(seed)
+    cases = []
+
+    for i in range(count):
+        buy_price = rnd.uniform(0.01, 100)
+        spread = rnd.randint(-5000, 20000) / 100 + 0.005 if i % 2 else rnd.uniform(-50, 200)
+
+        cases.append((
+            buy_price, buy_price * (200 + spread) / (200 - spread), rnd.choice(FEES), rnd.choice(FEES),
+            rnd.choice(NETWORKS)
+        ))
+
+    return cases
+
+
+def test_round_like_python_on_thousandths():
+    values = np.arange(-20000, 20000) / 1000
+
+    assert round_like_python(values).tolist() == [round(value, 2) for value in values.tolist()]
+    assert float(round_like_python(1.115)) == round(1.115, 2) == 1.11
+
+
+def test_batch_equals_scalar_row_by_row():
+    cases = routes(20000)
+
+    batch = ArbitoidAPI.profit_between_markets_batch(
+        [case[0] for case in cases], [case[1] for case in cases], [case[2] for case in cases],
+        [case[3] for case in cases], [min(case[4]) for case in cases], [max(case[4]) for case in cases]
+    )
+
+    for row, (buy_price, sell_price, buy_fee, sell_fee, network) in zip(batch.tolist(), cases):
+        assert row == ArbitoidAPI.profit_between_markets(
+            'buy', buy_price, 'sell', sell_price, network, {'buy': buy_fee, 'sell': sell_fee}
+        )
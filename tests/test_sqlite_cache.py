@@ -0,0 +1,31 @@
+import time
+
+from sqlite_cache import SQLiteCache
+
+
+def accessed(cache: SQLiteCache, key: str) -> float:
+    return cache.connection().execute("SELECT accessed FROM entries WHERE key = ?", (key,)).fetchone()[0]
+
+
+def test_hits_only_touch_stale_stamps(tmp_path):
+    cache = SQLiteCache(str(tmp_path / 'cache.sqlite3'), ttl=30, touch=0.2)
+    cache.set('coin:btc', b'{}')
+    stamp = accessed(cache, 'coin:btc')
+
+    # a reader inside the touch interval doesn't write
+    assert cache.get('coin:btc') == b'{}'
+    assert accessed(cache, 'coin:btc') == stamp
+
+    time.sleep(0.25)
+
+    assert cache.get('coin:btc') == b'{}'
+    assert accessed(cache, 'coin:btc') > stamp
+
+
+def test_pop_survives_a_broken_store(tmp_path):
+    cache = SQLiteCache(str(tmp_path / 'cache.sqlite3'))
+    cache.set('coin:btc', b'{}')
+    cache.connection().execute("DROP TABLE entries")
+
+    cache.pop('coin:btc')
+    assert cache.get('coin:btc') is None
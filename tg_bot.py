@@ -8,6 +8,9 @@ from aiogram.dispatcher.filters import Text
 from aiogram.dispatcher.filters.state import State, StatesGroup
 import aiogram.utils.markdown as md
 
+from render import AlertRenderer
+from resolver import CoinResolver
+
 
 class Form(StatesGroup):
     percent = State()
@@ -19,11 +22,16 @@ class Form(StatesGroup):
 
 class TelegramBot:
 
-    def __init__(self, api_token: str, arbitoid, logger=None):
+    def __init__(self, api_token: str, arbitoid, logger=None, resolver: CoinResolver = None, budget: float = None):
         self.bot = Bot(token=api_token)
         self.dp = Dispatcher(self.bot, storage=MemoryStorage())
         self.logger = logger
         self.arbitoid = arbitoid
+        self.renderer = AlertRenderer()
+        self.resolver = resolver if resolver is not None else CoinResolver(arbitoid, logger=logger)
+
+        # seconds a /pairs answer may take, FastAPI stops waiting on CoinGecko within it
+        self.budget = budget
 
         self.handlers()
 
@@ -68,8 +76,8 @@ class TelegramBot:
 
             try:
 
-                if self.arbitoid.input_user(message.from_user.id, message.from_user.username)['Response'] == 0:
-                    for admin in self.arbitoid.get_admins['Response']:
+                if (await self.arbitoid.input_user(message.from_user.id, message.from_user.username))['Response'] == 0:
+                    for admin in (await self.arbitoid.get_admins)['Response']:
                         await self.bot.send_message(admin['id'],
                                                     f"&#128314           "
                                                     f"{md.hitalic('New user')}           "
@@ -80,7 +88,7 @@ class TelegramBot:
                                                     f"\nTelegram bot: @Arbitroid_bot",
                                                     parse_mode='html')
 
-                if type(self.arbitoid.check_sub(message.from_user.id)['Response']) == int:
+                if type((await self.arbitoid.check_sub(message.from_user.id))['Response']) == int:
                     await self.bot.send_message(
                         message.from_user.id,
                         f"Welcome, @{message.from_user.username if message.from_user.username else 'user'}\n"
@@ -90,7 +98,7 @@ class TelegramBot:
 
                 else:
 
-                    user = self.arbitoid.get_user(message.from_user.id)['Response']
+                    user = (await self.arbitoid.get_user(message.from_user.id))['Response']
                     menu = self.main_menu(user)
                     menu.append(['➡ ADMIN_PANEL']) if user['is_admin'] else 0
                     markup = TelegramBot.keyboard(menu)
@@ -121,8 +129,8 @@ class TelegramBot:
         async def commands_account(message: types.Message):
             func_name = inspect.currentframe().f_code.co_name
             try:
-                if type(self.arbitoid.check_sub(message.from_user.id)['Response']) == str:
-                    user = self.arbitoid.get_user(message.from_user.id)['Response']
+                if type((await self.arbitoid.check_sub(message.from_user.id))['Response']) == str:
+                    user = (await self.arbitoid.get_user(message.from_user.id))['Response']
 
                     menu = self.main_menu(user)
                     menu.append(['➡ ADMIN_PANEL']) if user['is_admin'] else 0
@@ -153,9 +161,9 @@ class TelegramBot:
         async def commands_help(message: types.Message):
             func_name = inspect.currentframe().f_code.co_name
             try:
-                if type(self.arbitoid.check_sub(message.from_user.id)['Response']) == str:
+                if type((await self.arbitoid.check_sub(message.from_user.id))['Response']) == str:
 
-                    user = self.arbitoid.get_user(message.from_user.id)['Response']
+                    user = (await self.arbitoid.get_user(message.from_user.id))['Response']
                     menu = self.main_menu(user)
                     menu.append(['➡ ADMIN_PANEL']) if user['is_admin'] else 0
                     markup = TelegramBot.keyboard(menu)
@@ -185,10 +193,10 @@ class TelegramBot:
             func_name = inspect.currentframe().f_code.co_name
 
             try:
-                if type(self.arbitoid.check_sub(message.from_user.id)['Response']) == str:
-                    result = self.arbitoid.switch_status(message.from_user.id)['Response']
+                if type((await self.arbitoid.check_sub(message.from_user.id))['Response']) == str:
+                    result = (await self.arbitoid.switch_status(message.from_user.id))['Response']
 
-                    user = self.arbitoid.get_user(message.from_user.id)['Response']
+                    user = (await self.arbitoid.get_user(message.from_user.id))['Response']
                     menu = self.main_menu(user)
                     menu.append(['➡ ADMIN_PANEL']) if user['is_admin'] else 0
                     markup = TelegramBot.keyboard(menu)
@@ -226,7 +234,7 @@ class TelegramBot:
             func_name = inspect.currentframe().f_code.co_name
 
             try:
-                if type(self.arbitoid.check_sub(message.from_user.id)['Response']) == str:
+                if type((await self.arbitoid.check_sub(message.from_user.id))['Response']) == str:
 
                     markup = TelegramBot.keyboard(
                         [
@@ -265,7 +273,7 @@ class TelegramBot:
                     return
 
                 if current_state.split(':')[1] in ['percent', 'coin']:
-                    user = self.arbitoid.get_user(message.from_user.id)['Response']
+                    user = (await self.arbitoid.get_user(message.from_user.id))['Response']
                     menu = self.main_menu(user)
                     menu.append(['➡ ADMIN_PANEL']) if user['is_admin'] else 0
                     markup = TelegramBot.keyboard(menu)
@@ -294,9 +302,9 @@ class TelegramBot:
                 async with state.proxy() as data:
                     data['percent'] = message.text
 
-                result = self.arbitoid.resize_percent(message.from_user.id, float(data['percent']))['Response']
+                result = (await self.arbitoid.resize_percent(message.from_user.id, float(data['percent'])))['Response']
 
-                user = self.arbitoid.get_user(message.from_user.id)['Response']
+                user = (await self.arbitoid.get_user(message.from_user.id))['Response']
                 menu = self.main_menu(user)
                 menu.append(['➡ ADMIN_PANEL']) if user['is_admin'] else 0
                 markup = TelegramBot.keyboard(menu)
@@ -324,7 +332,7 @@ class TelegramBot:
 
             except Exception as error:
                 try:
-                    user = self.arbitoid.get_user(message.from_user.id)['Response']
+                    user = (await self.arbitoid.get_user(message.from_user.id))['Response']
                     menu = self.main_menu(user)
                     menu.append(['➡ ADMIN_PANEL']) if user['is_admin'] else 0
                     markup = TelegramBot.keyboard(menu)
@@ -349,9 +357,9 @@ class TelegramBot:
             func_name = inspect.currentframe().f_code.co_name
 
             try:
-                if type(self.arbitoid.check_sub(message.from_user.id)['Response']) == str:
+                if type((await self.arbitoid.check_sub(message.from_user.id))['Response']) == str:
 
-                    user = self.arbitoid.get_user(message.from_user.id)['Response']
+                    user = (await self.arbitoid.get_user(message.from_user.id))['Response']
 
                     menu = self.main_menu(user)
                     menu.append(['➡ ADMIN_PANEL']) if user['is_admin'] else 0
@@ -394,28 +402,48 @@ class TelegramBot:
         async def process_pairs(message: types.Message, state: FSMContext):
             func_name = inspect.currentframe().f_code.co_name
             try:
+                # a coin the index doesn't know costs neither a CoinGecko call nor one of the user's requests
+                coin, suggestions = await self.resolver.resolve(message.text)
+
                 async with state.proxy() as data:
-                    data['coin'] = message.text.lower()
+                    data['coin'] = coin
+
+                if coin:
+                    reply = await self.arbitoid.gecko_pairs(data['coin'], self.budget)
+                    result = reply['Response']
 
-                result = self.arbitoid.gecko_pairs(data['coin'])['Response']
-                self.arbitoid.add_req(message.from_user.id)
+                    # a request CoinGecko didn't answer in time isn't counted against the user
+                    await self.arbitoid.add_req(message.from_user.id) if 'Timeout' not in reply else 0
 
-                user = self.arbitoid.get_user(message.from_user.id)['Response']
+                user = (await self.arbitoid.get_user(message.from_user.id))['Response']
                 menu = self.main_menu(user)
                 menu.append(['➡ ADMIN_PANEL']) if user['is_admin'] else 0
                 markup = TelegramBot.keyboard(menu)
 
-                if result:
+                if not coin:
+                    await self.bot.send_message(
+                        message.from_user.id, "Unknown coin &#128219 \n" + (
+                            f"Did you mean: {', '.join(suggestions)}?\n" if suggestions else ""
+                        ) + "Try again, type the command 👉 /pairs", parse_mode='html',
+                        reply_markup=markup
+                    )
+
+                elif 'Timeout' in reply:
+                    await self.bot.send_message(
+                        message.from_user.id, "CoinGecko is too slow right now &#8987 \n"
+                                              "Try again in a minute 👉 /pairs", parse_mode='html',
+                        reply_markup=markup
+                    )
+
+                elif result:
                     f = await self.bot.send_message(
                         message.from_user.id,
                         "Initialized the analysis of the selected coin...  &#8987",
                         parse_mode='html'
                     )
 
-                    market_buy, buy_price, link_buy = \
-                        result[0]['market']['name'], result[0]['converted_last']['usd'], result[0]['trade_url']
-                    market_sell, sell_price, link_sell = \
-                        result[1]['market']['name'], result[1]['converted_last']['usd'], result[1]['trade_url']
+                    market_buy, buy_price = result[0]['market']['name'], result[0]['converted_last']['usd']
+                    market_sell, sell_price = result[1]['market']['name'], result[1]['converted_last']['usd']
                     network, market_fees = result[-1], result[2]
 
                     total_profit = self.arbitoid.profit_between_markets(
@@ -428,25 +456,9 @@ class TelegramBot:
 
                     await self.bot.send_message(
                         message.from_user.id,
-                        md.text(
-                            md.hitalic("Link to check: ") +
-                            f"https://www.coingecko.com/en/coins/{data['coin'].lower()}#markets" + ' &#9989'
-                            + '\n\n' + "Parameters &#128229/&#128228\n"
-                            + '├Market to buy: ' + md.hbold(market_buy)
-                            + '\n├Market link: \n'
-                            + link_buy[:link_buy.index('?') if '?' in link_buy else len(link_buy)]
-                            + "\n├Price to buy: " + md.hitalic(buy_price)
-                            + '\n├\n├Market to sell: ' + md.hbold(market_sell)
-                            + '\n├Market link: \n'
-                            + link_sell[:link_sell.index('?') if '?' in link_sell else len(link_sell)]
-                            + '\n├Price to sell: ' + md.hitalic(sell_price)
-                            + '\n\nTotal profit &#128184' + "\n├Without fees: " + md.hcode(total_profit[0])
-                            + "\n├Minimal profit: " + md.hcode(total_profit[1])
-                            + "\n├Maximum profit: " + md.hcode(total_profit[-1])
-                            + "\nNetwork: " + md.hbold(network[0])
-                            + "\nFinal result might be lower according to network fees"
-                            + "\n\nData collected by " + "@Arbitroid_bot",
-                            sep='\n',
+                        self.renderer.render(data['coin'], result, total_profit) + (
+                            "\n\n" + md.hitalic(f"CoinGecko is slow, prices from {reply['Stale']}s ago")
+                            if 'Stale' in reply else ""
                         ),
                         disable_web_page_preview=True,
                         parse_mode='html',
@@ -462,7 +474,7 @@ class TelegramBot:
 
             except Exception as error:
                 try:
-                    user = self.arbitoid.get_user(message.from_user.id)['Response']
+                    user = (await self.arbitoid.get_user(message.from_user.id))['Response']
                     menu = self.main_menu(user)
                     menu.append(['➡ ADMIN_PANEL']) if user['is_admin'] else 0
                     markup = TelegramBot.keyboard(menu)
@@ -491,7 +503,7 @@ class TelegramBot:
             func_name = inspect.currentframe().f_code.co_name
 
             try:
-                if message.from_user.id in [admin['id'] for admin in self.arbitoid.get_admins['Response']]:
+                if message.from_user.id in [admin['id'] for admin in (await self.arbitoid.get_admins)['Response']]:
                     markup = TelegramBot.keyboard([["X"]])
 
                     await Form.admin.set()
@@ -522,9 +534,9 @@ class TelegramBot:
                     data['admin'] = message.text
 
                 tg_id, status = list(map(int, data['admin'].split('|')))
-                result = self.arbitoid.add_admin(tg_id, status)['Response']
+                result = (await self.arbitoid.add_admin(tg_id, status))['Response']
 
-                user = self.arbitoid.get_user(tg_id)['Response']
+                user = (await self.arbitoid.get_user(tg_id))['Response']
                 markup = TelegramBot.keyboard(self.admin_panel())
 
                 if result == 0:
@@ -563,7 +575,8 @@ class TelegramBot:
 
                 else:
                     response_markup = TelegramBot.keyboard(self.main_menu(user)) \
-                        if type(self.arbitoid.check_sub(tg_id)['Response']) == str else types.ReplyKeyboardRemove()
+                        if type((await self.arbitoid.check_sub(tg_id))['Response']) == str \
+                        else types.ReplyKeyboardRemove()
 
                     await self.bot.send_message(
                         tg_id,
@@ -594,8 +607,8 @@ class TelegramBot:
             func_name = inspect.currentframe().f_code.co_name
 
             try:
-                if message.from_user.id in [admin['id'] for admin in self.arbitoid.get_admins['Response']]:
-                    user_stats = self.arbitoid.get_stats['Response']
+                if message.from_user.id in [admin['id'] for admin in (await self.arbitoid.get_admins)['Response']]:
+                    user_stats = (await self.arbitoid.get_stats)['Response']
                     markup = TelegramBot.keyboard(self.admin_panel())
 
                     await self.bot.send_message(
@@ -629,7 +642,7 @@ class TelegramBot:
             func_name = inspect.currentframe().f_code.co_name
 
             try:
-                if message.from_user.id in [admin['id'] for admin in self.arbitoid.get_admins['Response']]:
+                if message.from_user.id in [admin['id'] for admin in (await self.arbitoid.get_admins)['Response']]:
                     markup = TelegramBot.keyboard([["X"]])
 
                     await Form.sub.set()
@@ -660,9 +673,9 @@ class TelegramBot:
                     data['sub'] = message.text
 
                 tg_id, status = list(map(int, data['sub'].split('|')))
-                result = self.arbitoid.add_sub(tg_id, status)['Response']
+                result = (await self.arbitoid.add_sub(tg_id, status))['Response']
 
-                user = self.arbitoid.get_user(tg_id)['Response']
+                user = (await self.arbitoid.get_user(tg_id))['Response']
                 markup = TelegramBot.keyboard(self.admin_panel())
 
                 if result == 0:
@@ -725,7 +738,7 @@ class TelegramBot:
             func_name = inspect.currentframe().f_code.co_name
 
             try:
-                if message.from_user.id in [admin['id'] for admin in self.arbitoid.get_admins['Response']]:
+                if message.from_user.id in [admin['id'] for admin in (await self.arbitoid.get_admins)['Response']]:
                     markup = TelegramBot.keyboard([["X"]])
 
                     await Form.acc.set()
@@ -755,7 +768,7 @@ class TelegramBot:
                     data['check_user'] = message.text
 
                 tg_id = data['check_user']
-                result = self.arbitoid.get_user(tg_id)['Response']
+                result = (await self.arbitoid.get_user(tg_id))['Response']
 
                 markup = TelegramBot.keyboard(self.admin_panel())
 
@@ -808,9 +821,9 @@ class TelegramBot:
             func_name = inspect.currentframe().f_code.co_name
 
             try:
-                if message.from_user.id in [admin['id'] for admin in self.arbitoid.get_admins['Response']]:
+                if message.from_user.id in [admin['id'] for admin in (await self.arbitoid.get_admins)['Response']]:
 
-                    user = self.arbitoid.get_user(message.from_user.id)['Response']
+                    user = (await self.arbitoid.get_user(message.from_user.id))['Response']
                     menu = self.main_menu(user)
                     menu.append(['➡ ADMIN_PANEL']) if user['is_admin'] else 0
                     markup = TelegramBot.keyboard(menu)
@@ -835,7 +848,7 @@ class TelegramBot:
             func_name = inspect.currentframe().f_code.co_name
 
             try:
-                if message.from_user.id in [admin['id'] for admin in self.arbitoid.get_admins['Response']]:
+                if message.from_user.id in [admin['id'] for admin in (await self.arbitoid.get_admins)['Response']]:
                     menu = self.admin_panel()
                     markup = TelegramBot.keyboard(menu)
 
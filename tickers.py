@@ -0,0 +1,60 @@
+import sys
+
+import numpy as np
+
+
+class ExchangeIndex:
+    # Exchange names interned to small integer ids, fees become an array lookup instead of a dict walk
+
+    def __init__(self, market_fees: dict, default_fee: float = 0.1):
+        self.default_fee = default_fee
+
+        self.names = [sys.intern(name) for name in market_fees]
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        self.fees = np.array([market_fees[name] for name in market_fees], dtype=float)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.ids
+
+    def get_id(self, name: str) -> int:
+        # exchanges missing from market_fees get the default fee, like profit_between_markets does
+        exchange = self.ids.get(name)
+
+        if exchange is None:
+            exchange = self.ids[sys.intern(name)] = len(self.names)
+            self.names.append(name)
+            self.fees = np.append(self.fees, self.default_fee)
+
+        return exchange
+
+
+class Ticker:
+    # What the arbitrage logic needs from a CoinGecko ticker, built once while parsing the coin document
+    __slots__ = ('exchange', 'price', 'volume', 'trust_score', 'trade_url')
+
+    def __init__(self, exchange: int, price: float, volume: float, trust_score: str, trade_url: str):
+        self.exchange = exchange
+        self.price = price
+        self.volume = volume
+        self.trust_score = trust_score
+        self.trade_url = trade_url
+
+    @classmethod
+    def from_dict(cls, market: dict, exchanges: ExchangeIndex) -> 'Ticker':
+        return cls(
+            exchanges.get_id(market['market']["name"]), float(market["converted_last"]["usd"]),
+            float(market["converted_volume"]["usd"]), sys.intern(market["trust_score"] or ''), market['trade_url']
+        )
+
+    def as_dict(self, exchanges: ExchangeIndex) -> dict:
+        # CoinGecko layout, trimmed to the used fields, for the FastAPI response and the alert templates
+        return {
+            'market': {'name': exchanges.names[self.exchange]},
+            'converted_last': {'usd': self.price},
+            'converted_volume': {'usd': self.volume},
+            'trust_score': self.trust_score,
+            'trade_url': self.trade_url
+        }
@@ -0,0 +1,197 @@
+import time
+import asyncio
+import inspect
+import threading
+from urllib.parse import urlsplit
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+TRANSPORT_ERRORS = (requests.exceptions.RequestException,) + ((httpx.HTTPError,) if httpx else ())
+ASYNC_TRANSPORT_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+
+
+class DeadlineExceeded(TimeoutError):
+    # the caller's budget (time.monotonic() deadline) ran out before an answer, raised instead of waiting longer
+    pass
+
+
+def remaining(deadline: float = None) -> float or None:
+    if deadline is None:
+        return None
+
+    left = deadline - time.monotonic()
+
+    if left <= 0:
+        raise DeadlineExceeded(left)
+
+    return left
+
+
+class HTTPTransport:
+
+    def __init__(self, pool_size: int = 10, timeout: list or tuple = (3.05, 15), http2: bool = False, logger=None):
+        self.pool_size = pool_size
+
+        # (connect, read) in seconds, so a dead proxy can't hang a parser thread forever
+        self.timeout = tuple(timeout)
+
+        # HTTP/2 needs the optional httpx[http2] package, otherwise we silently stay on pooled HTTP/1.1
+        self.http2 = http2 and httpx is not None
+
+        self.logger = logger
+
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+        if http2 and httpx is None:
+            self.logger.warning("HTTPTransport/http2 requested, but httpx is not installed") if self.logger else 0
+
+    @classmethod
+    def session_key(cls, link: str, proxy: dict = None) -> tuple:
+        url = urlsplit(link)
+        return url.scheme, url.netloc, tuple(sorted(proxy.items())) if proxy else ()
+
+    def new_session(self, proxy: dict = None) -> requests.Session:
+        if self.http2:
+            limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            return httpx.Client(
+                http2=True, limits=limits, timeout=httpx.Timeout(self.timeout[-1], connect=self.timeout[0]),
+                mounts={
+                    f"{scheme}://": httpx.HTTPTransport(http2=True, limits=limits, proxy=url)
+                    for scheme, url in (proxy or {}).items()
+                }
+            )
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+        if proxy:
+            session.proxies.update(proxy)
+
+        return session
+
+    def session(self, link: str, proxy: dict = None) -> requests.Session:
+        # one keep-alive session per (host, proxy), so every call after the first skips TCP/TLS/CONNECT handshakes
+        key = self.session_key(link, proxy)
+        session = self._sessions.get(key)
+
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(key)
+
+                if session is None:
+                    session = self._sessions[key] = self.new_session(proxy)
+
+        return session
+
+    def request(self, req_type: str, link: str, params: dict = None, headers: dict = None, proxy: dict = None,
+                timeout: float or tuple = None, deadline: float = None) -> requests.Response:
+        session = self.session(link, proxy)
+        timeout = timeout or self.timeout
+
+        # connect and read run one after the other, so they share what is left of the caller's budget:
+        # connect gets at most half of it and read the rest, a request can't outlast the deadline
+        if deadline is not None:
+            left = remaining(deadline)
+            connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+            connect = min(connect, left / 2)
+            timeout = (connect, min(read, left - connect))
+
+        if self.http2 and isinstance(timeout, tuple):
+            timeout = httpx.Timeout(timeout[-1], connect=timeout[0])
+
+        return session.request(req_type.upper(), link, params=params or None, headers=headers, timeout=timeout)
+
+    def close(self) -> None:
+        func_name = inspect.currentframe().f_code.co_name
+
+        try:
+            with self._lock:
+                sessions, self._sessions = list(self._sessions.values()), {}
+
+            for session in sessions:
+                session.close()
+
+        except Exception as error:
+            self.logger.error(f"{func_name}/{error.__class__}||{error.args[0]}") if self.logger else 0
+
+        finally:
+            self.logger.info(f"{func_name}") if self.logger else 0
+
+
+class AsyncResponse:
+    # body is read before the aiohttp connection goes back to the pool, so callers keep the requests-like interface
+    __slots__ = ('status_code', 'content', 'headers')
+
+    def __init__(self, status_code: int, content: bytes, headers: dict):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+
+
+class AsyncHTTPTransport:
+
+    def __init__(self, pool_size: int = 10, timeout: list or tuple = (3.05, 15), concurrency: int = 50,
+                 logger=None):
+        self.pool_size = pool_size
+        self.timeout = tuple(timeout)
+
+        # upper bound of in-flight requests for the whole process, shared by every client on this transport
+        self.concurrency = concurrency
+
+        self.logger = logger
+
+        self._session = None
+        self._semaphore = None
+
+    def session(self) -> aiohttp.ClientSession:
+        # created lazily, aiohttp sessions have to be bound to the running event loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.pool_size),
+                timeout=aiohttp.ClientTimeout(connect=self.timeout[0], sock_read=self.timeout[-1])
+            )
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+
+        return self._session
+
+    async def request(self, req_type: str, link: str, params: dict = None, headers: dict = None,
+                      proxy: dict = None, timeout: float or tuple = None) -> AsyncResponse:
+        session = self.session()
+        proxy = (proxy or {}).get(link.split(':', 1)[0])
+
+        # requests silently drops None params (e.g. input_user without username), aiohttp refuses them
+        params = {key: value for key, value in (params or {}).items() if value is not None}
+
+        if timeout is not None:
+            timeout = aiohttp.ClientTimeout(connect=timeout[0], sock_read=timeout[-1]) \
+                if isinstance(timeout, tuple) else aiohttp.ClientTimeout(total=timeout)
+
+        async with self._semaphore:
+            async with session.request(
+                    req_type.upper(), link, params=params or None, headers=headers, proxy=proxy,
+                    timeout=timeout or session.timeout
+            ) as response:
+                return AsyncResponse(response.status, await response.read(), dict(response.headers))
+
+    async def close(self) -> None:
+        func_name = inspect.currentframe().f_code.co_name
+
+        try:
+            if self._session is not None:
+                await self._session.close()
+
+        except Exception as error:
+            self.logger.error(f"{func_name}/{error.__class__}||{error.args[0]}") if self.logger else 0
+
+        finally:
+            self.logger.info(f"{func_name}") if self.logger else 0
@@ -0,0 +1,112 @@
+import math
+import time
+import zlib
+import asyncio
+import inspect
+
+from polling import AdaptivePoller
+from prefilter import MarketPrefilter
+
+
+class CoinUniverse:
+    # Coins ranked by market cap, split in tiers of [size, every]: a tier's coins are scanned once every `every` sweeps,
+    # a 1/every slice of the tier per sweep, so the long tail is covered without bursts on the request budget
+
+    def __init__(self, gecko_api, tiers: list = ((200, 1),), per_page: int = 250, refresh: float = 3600,
+                 depth: int = None, prefilter: MarketPrefilter = None, poller: AdaptivePoller = None, logger=None):
+        self.gecko_api = gecko_api
+
+        self.tiers = [(int(size), max(1, int(every))) for size, every in tiers]
+        self.per_page = per_page
+
+        # with a prefilter the tiers are filled with the promising coins of a deeper list (depth coins by market cap)
+        self.prefilter = prefilter
+        self.pages = math.ceil((depth or sum(size for size, _ in self.tiers)) / per_page)
+
+        # the tiers give the base interval of a coin, the poller stretches or shortens it from its spread history
+        self.poller = poller
+
+        # seconds the coin list is trusted, ranks move slowly compared to spreads
+        self.refresh_interval = refresh
+
+        self.logger = logger
+
+        # last good copy of every page, a page that fails to refresh keeps its previous coins
+        self.cached_pages = {}
+        self.coins = []
+        self.scores = {}
+        self.updated = 0
+        self.sweep = 0
+
+    def __len__(self) -> int:
+        return len(self.coins)
+
+    async def refresh(self) -> bool:
+        func_name = inspect.currentframe().f_code.co_name
+
+        try:
+            # every page is fetched at once, through the same limiter as the coin documents
+            ids, fetched = [[] for _ in range(self.pages)], [[] for _ in range(self.pages)]
+            await asyncio.gather(*[
+                self.gecko_api.input_loc(ids[page - 1], page, self.per_page, fetched[page - 1])
+                for page in range(1, self.pages + 1)
+            ])
+
+            for page, markets in enumerate(fetched, 1):
+                if markets:
+                    self.cached_pages[page] = markets
+
+            # a coin moving between two pages during the refresh would otherwise be listed twice
+            markets = list({
+                market['id']: market for page in range(1, self.pages + 1) for market in self.cached_pages.get(page, [])
+            }.values())
+
+            coins = self.prefilter.select(markets) if self.prefilter else [market['id'] for market in markets]
+
+            if not coins:
+                return False
+
+            self.coins, self.updated = coins, time.monotonic()
+            self.scores = {market['id']: self.prefilter.score(market) for market in markets} if self.prefilter else {}
+
+            return True
+
+        except Exception as error:
+            self.logger.error(f"{func_name}/{error.__class__}||{error.args[0]}") if self.logger else 0
+            return False
+
+        finally:
+            self.logger.info(f"{func_name}/{len(self.coins)}/{self.pages}") if self.logger else 0
+
+    async def ensure_fresh(self) -> None:
+        if not self.coins or time.monotonic() - self.updated >= self.refresh_interval:
+            await self.refresh()
+
+    def due(self, select=None) -> list:
+        # coins to scan this sweep, hot tiers first; the slice of a coin is fixed by its id, not its (moving) rank.
+        # select(coins) keeps the coins of this process (sharding), the poller then adapts it to the spreads seen
+        sweep, due, start = self.sweep, [], 0
+        self.sweep += 1
+
+        if self.poller:
+            candidates = []
+
+            for size, every in self.tiers:
+                tier = self.coins[start:start + size]
+                start += size
+
+                candidates.extend((coin, every) for coin in (select(tier) if select else tier))
+
+            return self.poller.plan(candidates, sweep, self.scores)
+
+        for size, every in self.tiers:
+            tier = self.coins[start:start + size]
+            tier = select(tier) if select else tier
+            start += size
+
+            tier = tier if every == 1 else [coin for coin in tier if zlib.crc32(coin.encode()) % every == sweep % every]
+
+            # within a tier the likeliest spreads are fetched first
+            due.extend(sorted(tier, key=lambda coin: -self.scores.get(coin, 0)) if self.scores else tier)
+
+        return due